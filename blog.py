@@ -48,17 +48,16 @@ st.title("DIT IS EEN TEST")
 # In[4]:
 
 
-# Import the needed library
-#get_ipython().system('pip install chardet')
-import chardet
+# Import the encoding manifest, which uses the chardet library for files it hasn't seen yet
+from file_encoding import detect_encoding
 
 # Create a dict with file paths
 files = {"NetflixOriginals.csv": "./data/NetflixOriginals.csv", "netflix.csv": "./data/netflix.csv", "netflix1.csv": "./data/netflix1.csv"}
 
-# Loop through the dict, and print out the names and encoding type 
+# Loop through the dict, and print out the names and encoding type. The encodings are
+# stored in data/.encodings.json, so chardet only runs for new or changed files
 for name, file in files.items():
-    with open(file, 'rb') as rawdata:
-        result = chardet.detect(rawdata.read(100000))
+    result = detect_encoding(file)
     print(name, result)
 
 
@@ -71,20 +70,19 @@ for name, file in files.items():
 # In[127]:
 
 
-# Import Pandas
-import pandas as pd
+# Import the schema of our datasets, it reads a dataset with Pandas and parses every date
+# column with its format
+from schema import read_dataset
 
 
 # In[151]:
 
 
-# Import the first dataset, and decode the csv file with Windows-1252 encoding
-df = pd.read_csv("./data/NetflixOriginals.csv", encoding="Windows-1252")
-
-# Change the column name of Premiere and set the format in DateTime to match the other dataset 
-df.rename(columns = {"Premiere": "Date"}, inplace=True)
-df.rename(columns = {"Title": "title"}, inplace=True)
-df["Date"] = pd.to_datetime(df["Date"])
+# Import the first dataset, and decode the csv file with Windows-1252 encoding. Premiere is
+# parsed to DateTime with the format of the schema, and renamed to Date (and Title to title)
+# to match the other datasets. Rows with a date that doesn't match are kept in rejects
+df, rejects = read_dataset("NetflixOriginals.csv", "./data/NetflixOriginals.csv",
+                           encoding="Windows-1252")
 
 # Show the first 5 rows
 df.head()
@@ -94,7 +92,7 @@ df.head()
 
 
 # Load in the second dataset
-df2 = pd.read_csv("./data/netflix1.csv")
+df2, rejects2 = read_dataset("netflix1.csv", "./data/netflix1.csv")
 
 # Change the column name of title to match the other dataset
 # df2.rename(columns = {"title": "Title"}, inplace=True)
@@ -106,10 +104,8 @@ df2.head()
 # In[153]:
 
 
-# Load in the third dataset
-df3 = pd.read_csv("./data/netflix.csv")
-
-df3["Date"] = pd.to_datetime(df3["Date"])
+# Load in the third dataset, with the Date column in DateTime
+df3, rejects3 = read_dataset("netflix.csv", "./data/netflix.csv")
 
 # Show the first 5 rows
 df3.head()
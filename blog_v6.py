@@ -84,16 +84,16 @@
 # In[7]:
 
 
-# Import the needed library
-import chardet
+# Import the encoding manifest, which uses the chardet library for files it hasn't seen yet
+from file_encoding import detect_encoding
 
 # Create a dict with file paths
 files = {"NetflixOriginals.csv": "./data/NetflixOriginals.csv", "netflix.csv": "./data/netflix.csv", "netflix1.csv": "./data/netflix1.csv"}
 
-# Loop through the dict, and print out the names and encoding type 
+# Loop through the dict, and print out the names and encoding type. The encodings are
+# stored in data/.encodings.json, so chardet only runs for new or changed files
 for name, file in files.items():
-    with open(file, 'rb') as rawdata:
-        result = chardet.detect(rawdata.read(100000))
+    result = detect_encoding(file)
     print(name, result)
 
 
@@ -106,20 +106,19 @@ for name, file in files.items():
 # In[8]:
 
 
-# Import Pandas
-import pandas as pd
+# Import the cached loaders of our datasets (see netflix_data.py)
+from netflix_data import (load_originals, load_catalog, load_stock, load_merged, load_netflix_df,
+                          load_memory_report, load_rollups)
+from rollups import rollup_table
+from time_buckets import bucket_start
 
 
 # In[9]:
 
 
-# Import the first dataset, and decode the csv file with Windows-1252 encoding
-df = pd.read_csv("./data/NetflixOriginals.csv", encoding="Windows-1252")
-
-# Change the column name of Premiere and set the format in DateTime to match the other dataset 
-df.rename(columns = {"Premiere": "Date"}, inplace=True)
-df.rename(columns = {"Title": "title"}, inplace=True)
-df["Date"] = pd.to_datetime(df["Date"])
+# Import the first dataset, decoded with Windows-1252 encoding. The Premiere column
+# is renamed to Date and set to DateTime to match the other dataset
+df = load_originals()
 
 # Show the first 5 rows
 df.head()
@@ -129,7 +128,7 @@ df.head()
 
 
 # Load in the second dataset
-df2 = pd.read_csv("./data/netflix1.csv")
+df2 = load_catalog()
 
 # Change the column name of title to match the other dataset
 # df2.rename(columns = {"title": "Title"}, inplace=True)
@@ -141,10 +140,9 @@ df2.head()
 # In[11]:
 
 
-# Load in the third dataset
-df3 = pd.read_csv("./data/netflix.csv")
-
-df3["Date"] = pd.to_datetime(df3["Date"])
+# Load in the third dataset, with the Date column in DateTime. The prices come from the stock
+# store, so only the first days we show are read
+df3 = load_stock(end="2002-05-31")
 
 # Show the first 5 rows
 df3.head()
@@ -165,8 +163,9 @@ df3.head()
 # In[12]:
 
 
-# Create a new dataframe by merging df, df2, df3 on shared column names and using the Left Join
-netflix_df = df.merge(df2[["title", "rating"]], on="title", how="left")         .merge(df3, on="Date", how="left") 
+# Create a new dataframe by merging df, df2, df3 on shared column names and using the Left Join.
+# Premieres in the weekend or on a holiday get the stock data of the next trading day
+netflix_df = load_merged()
 netflix_df.head()
 
 
@@ -186,25 +185,20 @@ netflix_df.info()
 netflix_df.isna().sum()
 
 
-# The Rating column and all the columns with Stock data have NaN values. We now have to decide what we want to do with the those rows, there are two main options for this: `pd.fillna` or `pd.dropna`. 
+# Only the Rating column has NaN values, for the 13 titles we couldn't find in the catalog. We now have to decide what we want to do with the those rows, there are two main options for this: `pd.fillna` or `pd.dropna`. 
 # 
 # ##### Rating column
-# For the Rating column we have decided to fill all NaN values with U for unknown, because 80 rows would be alot of data to discard.
+# For the Rating column we have decided to fill all NaN values with U for unknown, because we don't want to discard 13 movies only for a missing rating.
 # 
 # ##### Stock data columns
-# For the Stock data columns we've tried to apply the `pd.interpolate` function, but it wasn't succesfull . We've decided to drop the rows in question, because dropping 36 rows could be better justified
+# Every premiere gets the stock data of the next trading day, so no rows miss their stock data and none are dropped. The `pd.dropna` only drops a premiere without a trading day in the 4 days after it
 
 # In[15]:
 
 
-# Sort all values in the Dataframe by date, to order the data first
-netflix_df.sort_values("Date", inplace=True)
-
-# Fill the NaN values of the rating column with U 
-netflix_df["rating"].fillna("U", inplace=True)
-
-# Drop all rows with NaN values
-netflix_df.dropna(inplace=True)
+# Sort all values in the Dataframe by date, fill the NaN values of the rating column
+# with U and drop all rows with NaN values
+netflix_df = load_netflix_df()
 
 
 # In[16]:
@@ -213,6 +207,10 @@ netflix_df.dropna(inplace=True)
 # Check the number of rows and datatypes again
 netflix_df.info()
 
+# The text columns with few values are categories and the prices are float32, check the
+# memory in bytes before and after compacting the datatypes
+print(load_memory_report())
+
 
 # In[17]:
 
@@ -379,33 +377,53 @@ because Pandas doesn't have problems with loading in the other encoding formats'
 # In[33]:
 
 
-code = '''# Import Pandas
+code = '''# Import Pandas, and the schema of our datasets, it reads a dataset with Pandas and
+# parses every date column with its format
 import pandas as pd
+from schema import read_dataset
 
-# Import the first dataset, and decode the csv file with Windows-1252 encoding
-df = pd.read_csv("./data/NetflixOriginals.csv", encoding="Windows-1252")
-
-# Change the column name of Premiere and set the format in DateTime to match the other dataset 
-df.rename(columns = {"Premiere": "Date"}, inplace=True)
-df.rename(columns = {"Title": "title"}, inplace=True)
-df["Date"] = pd.to_datetime(df["Date"])
+# Import the first dataset, and decode the csv file with Windows-1252 encoding. Premiere is
+# parsed to DateTime with the format of the schema, and renamed to Date (and Title to title)
+# to match the other datasets. Rows with a date that doesn't match are kept in rejects
+df, rejects = read_dataset("NetflixOriginals.csv", "./data/NetflixOriginals.csv",
+                           encoding="Windows-1252")
 
 # Load in the second dataset
-df2 = pd.read_csv("./data/netflix1.csv")
-
-# Load in the third dataset
-df3 = pd.read_csv("./data/netflix.csv")
+df2, rejects2 = read_dataset("netflix1.csv", "./data/netflix1.csv")
 
-df3["Date"] = pd.to_datetime(df3["Date"])'''
+# Load in the third dataset, with the Date column in DateTime
+df3, rejects3 = read_dataset("netflix.csv", "./data/netflix.csv")'''
 st.code(code, language= "python")
 
 
 # In[34]:
 
 
-code = '''# Create a new dataframe by merging df, df2, df3 on shared column names and using the Left Join
-netflix_df = df.merge(df2[["title", "rating"]], on="title", how="left") \
-        .merge(df3, on="Date", how="left") 
+code = '''import numpy as np
+from joins import (build_title_index, build_trigram_index, dedupe_on_key, title_join,
+                   title_keys, trigram_candidates)
+
+# Keep one catalog row per title, a Movie wins over a TV Show with the same title
+df2, report = dedupe_on_key(df2, title_keys(df2["title"]), policy="movie")
+
+# Left Join the rating of the catalog on the normalized title (casefolded, without accents
+# and punctuation)
+netflix_df = title_join(df, df2, build_title_index(df2["title"]), ["rating"])
+
+# Titles that are written differently in the catalog get the rating of the most similar
+# catalog title, when at least half of their character trigrams match
+missing = np.flatnonzero(netflix_df["rating"].isna().values)
+best = trigram_candidates(build_trigram_index(df2["title"]), netflix_df["title"].values[missing],
+                          k=1, min_similarity=0.5)
+netflix_df.loc[missing[best["query"].values], "rating"] = \
+    df2["rating"].iloc[best["row"].values].values
+
+# Left Join the stock data of the first trading day on or after the premiere (at most 4 days
+# later), so premieres in the weekend or on a holiday keep their stock data
+netflix_df = pd.merge_asof(netflix_df.sort_values("Date"),
+                           df3.rename(columns={"Date": "Trading Date"}),
+                           left_on="Date", right_on="Trading Date",
+                           direction="forward", tolerance=pd.Timedelta(days=4))
 netflix_df.head()'''
 st.code(code, language = "python")
 
@@ -413,18 +431,18 @@ st.code(code, language = "python")
 # In[35]:
 
 
-st.text('''The Rating column and all the columns with Stock data have NaN values.We now have to 
-decide what we want to do with the those rows, there are two main options 
-for this: `pd.fillna` or `pd.dropna`. 
+st.text('''Only the Rating column has NaN values, for the 13 titles we couldn't find in the
+catalog. We now have to decide what we want to do with the those rows, there are two
+main options for this: `pd.fillna` or `pd.dropna`. 
 
 Rating column
 For the Rating column we have decided to fill all NaN values with U for
-unknown, because 80 rows would be alot of data to discard.
+unknown, because we don't want to discard 13 movies only for a missing rating.
 
 Stock data columns
-For the Stock data columns we've tried to apply the `pd.interpolate` 
-function, but it wasn't succesfull . We've decided to drop the rows in 
-question, because dropping 36 rows could be better justified''')
+Every premiere gets the stock data of the next trading day, so no rows miss
+their stock data and none are dropped. The `pd.dropna` only drops a premiere
+without a trading day in the 4 days after it.''')
 
 
 # In[36]:
@@ -445,11 +463,14 @@ st.code(code, language = "python")
 # In[37]:
 
 
-# Create a exchange rate difference column, to with the difference between the High and Low points of the day
-netflix_df["Daily exchange rate difference"] = netflix_df["Open"] - netflix_df["Close"]
+# The loader already added the exchange rate difference column, the difference between the
+# Open and Close price of the day
 
-# Create a DataFrame with the top 20 movies with the highest IMDB Scores
-imdb_top20 = netflix_df.sort_values(['IMDB Score'], ascending=False)[0:20]
+# Create a DataFrame with the top 20 movies with the highest IMDB Scores, from the top k
+# index (see top_k.py) instead of sorting all movies. load_top_k(20, "Genre", "Drama") gives
+# the top 20 of a Genre, and the same for a rating or year
+from netflix_data import load_top_k
+imdb_top20 = load_top_k(20)
 
 # Show the first 5 rows
 netflix_df.head()
@@ -458,8 +479,23 @@ netflix_df.head()
 # In[38]:
 
 
-# Maak een streamlit dataframe zodat hij weergeven wordt op de app
-st_netflix_df = st.dataframe(netflix_df)
+# Maak een streamlit dataframe zodat hij weergeven wordt op de app. The table is sorted,
+# filtered and paged on the server, only the rows of the shown page are sent to the browser
+from netflix_data import load_table_columns, load_table_page
+from table_pages import PAGE_SIZE
+
+table_columns = load_table_columns()
+sort_column, order_column, filter_column, filter_text_column = st.columns(4)
+sort_by = sort_column.selectbox("Sort by", ["Date"] + [c for c in table_columns if c != "Date"])
+ascending = order_column.radio("Order", ["Ascending", "Descending"]) == "Ascending"
+filter_on = filter_column.selectbox("Filter on", table_columns, index=table_columns.index("title"))
+filter_text = filter_text_column.text_input("Contains")
+
+page = st.number_input("Page", min_value=1, value=1, step=1)
+table_rows, table_total = load_table_page(sort_by, ascending, filter_on, filter_text, page - 1)
+page_count = max(-(-table_total // PAGE_SIZE), 1)
+st.text("Page %d of %d, %d movies" % (min(page, page_count), page_count, table_total))
+st_netflix_df = st.dataframe(table_rows)
 
 
 # In[39]:
@@ -485,7 +521,11 @@ chart to visualize the amount of movies per Genre.''')
 
 
 code = """import plotly.express as px
-fig = px.bar(netflix_df , x='Genre', title="Movie count by Genre")
+from chart_data import category_counts, category_totals, first_row_styles
+
+# Count the movies per Genre first, so the figure has one bar per Genre instead of one per movie
+genre_counts = category_counts(netflix_df, 'Genre')
+fig = px.bar(genre_counts, x='Genre', y='count', title="Movie count by Genre")
 fig.update_xaxes(rangeslider_visible=True)
 fig.update_layout(width=1000, height=1000)
 
@@ -498,12 +538,23 @@ st.code(code, language="python")
 
 
 import plotly.express as px
-fig = px.bar(netflix_df , x='Genre', title="Movie count by Genre")
-fig.update_xaxes(rangeslider_visible=True)
-fig.update_layout(width=1000, height=1000)
+from chart_data import category_counts, category_totals, first_row_styles
+from figure_cache import cached_figure
+
+
+# The built figures are cached (see figure_cache.py), a figure is only built again when
+# the columns it is built from change
+def genre_bar():
+    # Count the movies per Genre first, so the figure has one bar per Genre instead of one per movie
+    genre_counts = category_counts(netflix_df, 'Genre')
+    fig = px.bar(genre_counts, x='Genre', y='count', title="Movie count by Genre")
+    fig.update_xaxes(rangeslider_visible=True)
+    fig.update_layout(width=1000, height=1000)
+    return fig
 
+
+fig = cached_figure("genre bar", [netflix_df[['Genre']]], genre_bar)
 st.plotly_chart(fig)
-fig.show()
 
 
 # In[44]:
@@ -534,12 +585,20 @@ rate to the IMDB Scores, where we'll use a scatter plot.
 # In[47]:
 
 
-code= """fig = px.line(netflix_df, 
+code= """from chart_data import downsample, render_mode, select_range
+
+# Zooming in with the slider downsamples only the selected dates, at a finer resolution
+first, last = netflix_df["Date"].iloc[0].to_pydatetime(), netflix_df["Date"].iloc[-1].to_pydatetime()
+start, end = st.slider("Dates", min_value=first, max_value=last, value=(first, last), format="YYYY-MM-DD")
+line_df = downsample(select_range(netflix_df, "Date", start, end), "Date", "Daily exchange rate difference")
+
+fig = px.line(line_df, 
               x="Date", 
               y="Daily exchange rate difference",
               title= "Daily Exchange Rate Difference by Year",
               labels= {"Date": "Year", "Daily exchange rate difference": "Daily Exchange Rate Difference"},
-              hover_name="title")
+              hover_name="title",
+              render_mode=render_mode(len(line_df)))
 fig.update_layout(width=1000, height=1000)
 st.plotly_chart(fig)
 fig.show()"""
@@ -549,15 +608,31 @@ st.code(code, language="python")
 # In[48]:
 
 
-fig = px.line(netflix_df, 
-              x="Date", 
-              y="Daily exchange rate difference",
-              title= "Daily Exchange Rate Difference by Year",
-              labels= {"Date": "Year", "Daily exchange rate difference": "Daily Exchange Rate Difference"},
-              hover_name="title")
-fig.update_layout(width=1000, height=1000)
+from chart_data import downsample, render_mode, select_range
+
+# The line is downsampled to the width of the figure (LTTB), and drawn with WebGL when it
+# still has many points. Zooming in with the slider downsamples only the selected dates,
+# so the resolution gets finer
+first, last = netflix_df["Date"].iloc[0].to_pydatetime(), netflix_df["Date"].iloc[-1].to_pydatetime()
+start, end = st.slider("Dates", min_value=first, max_value=last, value=(first, last), format="YYYY-MM-DD")
+line_df = downsample(select_range(netflix_df, "Date", start, end), "Date", "Daily exchange rate difference")
+line_df = line_df[["Date", "Daily exchange rate difference", "title"]]
+
+
+def exchange_rate_line():
+    fig = px.line(line_df, 
+                  x="Date", 
+                  y="Daily exchange rate difference",
+                  title= "Daily Exchange Rate Difference by Year",
+                  labels= {"Date": "Year", "Daily exchange rate difference": "Daily Exchange Rate Difference"},
+                  hover_name="title",
+                  render_mode=render_mode(len(line_df)))
+    fig.update_layout(width=1000, height=1000)
+    return fig
+
+
+fig = cached_figure("exchange rate line", [line_df], exchange_rate_line)
 st.plotly_chart(fig)
-fig.show()
 
 
 # In[ ]:
@@ -569,12 +644,15 @@ fig.show()
 # In[51]:
 
 
-code = """fig = px.scatter(netflix_df, 
-                x="IMDB Score", 
-                y="Daily exchange rate difference",
-                color="Genre",
-                title="Daily Exchange Rate Difference by IMDB Score & Genre",
-                labels= {"exchange rate difference" : "Daily Exchange Rate Difference", "IMDB Score": "IMDB Score"})
+code = """from chart_data import scatter_figure
+
+# Above RASTER_POINT_THRESHOLD movies the points are binned into a density grid per Genre
+fig = scatter_figure(netflix_df, 
+                     x="IMDB Score", 
+                     y="Daily exchange rate difference",
+                     color="Genre",
+                     title="Daily Exchange Rate Difference by IMDB Score & Genre",
+                     labels= {"exchange rate difference" : "Daily Exchange Rate Difference", "IMDB Score": "IMDB Score"})
 fig.update_layout(width=1000, height=1000)
 st.plotly_chart(fig)
 fig.show()"""
@@ -584,15 +662,24 @@ st.code(code, language="python")
 # In[52]:
 
 
-fig = px.scatter(netflix_df, 
-                x="IMDB Score", 
-                y="Daily exchange rate difference",
-                color="Genre",
-                title="Daily Exchange Rate Difference by IMDB Score & Genre",
-                labels= {"exchange rate difference" : "Daily Exchange Rate Difference", "IMDB Score": "IMDB Score"})
-fig.update_layout(width=1000, height=1000)
+from chart_data import scatter_figure
+
+def imdb_exchange_rate_scatter():
+    # Above RASTER_POINT_THRESHOLD movies the points are binned into a density grid per Genre
+    fig = scatter_figure(netflix_df, 
+                         x="IMDB Score", 
+                         y="Daily exchange rate difference",
+                         color="Genre",
+                         title="Daily Exchange Rate Difference by IMDB Score & Genre",
+                         labels= {"exchange rate difference" : "Daily Exchange Rate Difference", "IMDB Score": "IMDB Score"})
+    fig.update_layout(width=1000, height=1000)
+    return fig
+
+
+fig = cached_figure("imdb exchange rate scatter",
+                    [netflix_df[["IMDB Score", "Daily exchange rate difference", "Genre"]]],
+                    imdb_exchange_rate_scatter)
 st.plotly_chart(fig)
-fig.show()
 
 
 # In[53]:
@@ -627,16 +714,20 @@ bar graph to visualize this.
 
 code = '''import plotly.graph_objects as go
 
-imdb_top20 = netflix_df.sort_values(['IMDB Score'], ascending=False)[0:20]
+imdb_top20 = load_top_k(20)
 
-labels = imdb_top20["Genre"]
-values = imdb_top20["IMDB Score"]
-colours = px.colors.sequential.Aggrnyl
+# Add up the IMDB Scores per Genre first, the pie has one slice per Genre anyway. A slice
+# keeps the pull and colour of the highest ranked movie of its Genre
+genre_scores = category_totals(imdb_top20, "Genre", "IMDB Score")
+labels = genre_scores["Genre"]
+values = genre_scores["IMDB Score"]
+pull = first_row_styles(imdb_top20, "Genre", labels, [0.2, 0, 0.3, 0], default=0)
+colours = first_row_styles(imdb_top20, "Genre", labels, px.colors.sequential.Aggrnyl)
 
 fig = go.Figure()
 fig.add_trace(go.Pie(labels=labels, 
                      values=values, 
-                     pull=[0.2, 0, 0.3, 0],
+                     pull=pull,
                      marker= {'colors' : colours}))
 fig.update_layout(title="Top 20 IMDB Scores distribution")
 st.plotly_chart(fig)
@@ -649,19 +740,28 @@ st.code(code, language="python")
 
 import plotly.graph_objects as go
 
-labels = imdb_top20["Genre"]
-values = imdb_top20["IMDB Score"]
-colours = px.colors.sequential.Aggrnyl
 
-fig = go.Figure()
-fig.add_trace(go.Pie(labels=labels, 
-                     values=values, 
-                     pull=[0.2, 0, 0.3, 0],
-                     marker= {'colors' : colours}))
-fig.update_layout(title="Top 20 IMDB Scores distribution by Genre",
-                  width=1000, height=1000)
+def top20_pie():
+    # Add up the IMDB Scores per Genre first, the pie has one slice per Genre anyway. A slice
+    # keeps the pull and colour of the highest ranked movie of its Genre
+    genre_scores = category_totals(imdb_top20, "Genre", "IMDB Score")
+    labels = genre_scores["Genre"]
+    values = genre_scores["IMDB Score"]
+    pull = first_row_styles(imdb_top20, "Genre", labels, [0.2, 0, 0.3, 0], default=0)
+    colours = first_row_styles(imdb_top20, "Genre", labels, px.colors.sequential.Aggrnyl)
+
+    fig = go.Figure()
+    fig.add_trace(go.Pie(labels=labels, 
+                         values=values, 
+                         pull=pull,
+                         marker= {'colors' : colours}))
+    fig.update_layout(title="Top 20 IMDB Scores distribution by Genre",
+                      width=1000, height=1000)
+    return fig
+
+
+fig = cached_figure("top 20 pie", [imdb_top20[["Genre", "IMDB Score"]]], top20_pie)
 st.plotly_chart(fig)
-fig.show()
 
 
 # In[58]:
@@ -681,14 +781,19 @@ st.code(code, language="python")
 # In[59]:
 
 
-fig = px.bar(imdb_top20, 
-             x="IMDB Score",
-             y="title",
-             color="Genre",
-             labels={"title": "Movie Title"},
-             title="Top 20 Movies by IMDB Scores")
-fig.update_layout(width=1000, height=1000)
-fig.show()
+def top20_bar():
+    fig = px.bar(imdb_top20, 
+                 x="IMDB Score",
+                 y="title",
+                 color="Genre",
+                 labels={"title": "Movie Title"},
+                 title="Top 20 Movies by IMDB Scores")
+    fig.update_layout(width=1000, height=1000)
+    return fig
+
+
+fig = cached_figure("top 20 bar", [imdb_top20[["IMDB Score", "title", "Genre"]]], top20_bar)
+st.plotly_chart(fig)
 
 
 # In[72]:
@@ -719,20 +824,24 @@ the different PG-Ratings, for which we'll use a scatter plot.
 # In[63]:
 
 
-code = """rating_buttons = [{'label': "All", 'method': "update", 'args': [{"visible": [True, True, True, True, True, True, True, True, True, True]},{'title':'All'}]},
-             {'label': "TV-14", 'method': "update", 'args': [{"visible": [True, False, False, False, False, False, False, False, False, False]},{'title':'TV-14'}]},
-             {'label': "TV-MA", 'method': "update", 'args': [{"visible": [False, True, False, False, False, False, False, False, False, False]},{'title':'TV-MA'}]},
-             {'label': "TV-PG", 'method': "update", 'args': [{"visible": [False, False, True, False, False, False, False, False, False, False]},{'title':'TV-PG'}]},
-             {'label': "U", 'method': "update", 'args': [{"visible": [False, False, False, True, False, False, False, False, False, False]},{'title':'U'}]},
-             {'label': "TV-G", 'method': "update", 'args': [{"visible": [False, False, False, False, True, False, False, False, False, False]},{'title':'TV-G'}]},
-             {'label': "PG-13", 'method': "update", 'args': [{"visible": [False, False, False, False, False, True, False, False, False, False]},{'title':'PG-13'}]},
-             {'label': "R", 'method': "update", 'args': [{"visible": [False, False, False, False, False, False, True, False, False, False]},{'title':'R'}]},
-             {'label': "TV-Y", 'method': "update", 'args': [{"visible": [False, False, False, False, False, False, False, True, False, False]},{'title':'TV-Y'}]},
-             {'label': "TV-Y7", 'method': "update", 'args': [{"visible": [False, False, False, False, False, False, False, False, True, False]},{'title':'TV-Y7'}]},
-             {'label': "PG", 'method': "update", 'args': [{"visible": [False, False, False, False, False, False, False, False, False, True]},{'title':'PG'}]}]
-
-fig = px.scatter(data_frame=netflix_df, x='Date', y='IMDB Score', color='rating')
-fig.update_layout({'updatemenus':[{'type': 'dropdown','x': 1.3,'y': 1,'showactive': True,'active': 0,'buttons': rating_buttons}]})
+code = """from category_filter import (ALL, category_index, category_orders, client_side,
+                             filter_rows, visibility_buttons)
+
+# The ratings, and the rating of every movie, come from the data. With few ratings a dropdown
+# switches the traces in the browser, with many only the selected rating is sent
+ratings = category_index(netflix_df['rating'])
+if st.checkbox("Filter the PG-ratings on the server", value=not client_side(ratings)):
+    rating_df = filter_rows(netflix_df, ratings, st.selectbox("PG-rating", [ALL] + ratings["categories"]))
+    rating_buttons = []
+else:
+    rating_df = netflix_df
+    rating_buttons = visibility_buttons(ratings, title="%s")
+
+fig = px.scatter(data_frame=rating_df, x='Date', y='IMDB Score', color='rating',
+                 category_orders=category_orders('rating', ratings),
+                 render_mode=render_mode(len(rating_df)))
+if rating_buttons:
+    fig.update_layout({'updatemenus':[{'type': 'dropdown','x': 1.3,'y': 1,'showactive': True,'active': 0,'buttons': rating_buttons}]})
 fig.update_xaxes(rangeslider_visible=True)
 fig.update_layout(title="Netflix Movies' PG-rating and their IMDB score ")
 st.plotly_chart(fig)
@@ -743,25 +852,36 @@ st.code(code, language="python")
 # In[67]:
 
 
-rating_buttons = [{'label': "All", 'method': "update", 'args': [{"visible": [True, True, True, True, True, True, True, True, True, True]},{'title':'All'}]},
-             {'label': "TV-14", 'method': "update", 'args': [{"visible": [True, False, False, False, False, False, False, False, False, False]},{'title':'TV-14'}]},
-             {'label': "TV-MA", 'method': "update", 'args': [{"visible": [False, True, False, False, False, False, False, False, False, False]},{'title':'TV-MA'}]},
-             {'label': "TV-PG", 'method': "update", 'args': [{"visible": [False, False, True, False, False, False, False, False, False, False]},{'title':'TV-PG'}]},
-             {'label': "U", 'method': "update", 'args': [{"visible": [False, False, False, True, False, False, False, False, False, False]},{'title':'U'}]},
-             {'label': "TV-G", 'method': "update", 'args': [{"visible": [False, False, False, False, True, False, False, False, False, False]},{'title':'TV-G'}]},
-             {'label': "PG-13", 'method': "update", 'args': [{"visible": [False, False, False, False, False, True, False, False, False, False]},{'title':'PG-13'}]},
-             {'label': "R", 'method': "update", 'args': [{"visible": [False, False, False, False, False, False, True, False, False, False]},{'title':'R'}]},
-             {'label': "TV-Y", 'method': "update", 'args': [{"visible": [False, False, False, False, False, False, False, True, False, False]},{'title':'TV-Y'}]},
-             {'label': "TV-Y7", 'method': "update", 'args': [{"visible": [False, False, False, False, False, False, False, False, True, False]},{'title':'TV-Y7'}]},
-             {'label': "PG", 'method': "update", 'args': [{"visible": [False, False, False, False, False, False, False, False, False, True]},{'title':'PG'}]}]
-
-fig = px.scatter(data_frame=netflix_df, x='Date', y='IMDB Score', color='rating')
-fig.update_layout({'updatemenus':[{'type': 'dropdown','x': 1.3,'y': 1,'showactive': True,'active': 0,'buttons': rating_buttons}]})
-fig.update_xaxes(rangeslider_visible=True)
-fig.update_layout(title="Netflix Movies' PG-rating and their IMDB score ")
-fig.update_layout(width=1000, height=1000)
+from category_filter import (ALL, category_index, category_orders, client_side,
+                             filter_rows, visibility_buttons)
+
+# The ratings, and the rating of every movie, come from the data (see category_filter.py):
+# rating i is trace i of the figure. With few ratings a dropdown switches the traces in the
+# browser, with many only the movies of the selected rating are sent
+ratings = category_index(netflix_df['rating'])
+if st.checkbox("Filter the PG-ratings on the server", value=not client_side(ratings)):
+    rating_df = filter_rows(netflix_df, ratings, st.selectbox("PG-rating", [ALL] + ratings["categories"]))
+    rating_buttons = []
+else:
+    rating_df = netflix_df
+    rating_buttons = visibility_buttons(ratings, title="%s")
+
+
+def rating_scatter():
+    fig = px.scatter(data_frame=rating_df, x='Date', y='IMDB Score', color='rating',
+                     category_orders=category_orders('rating', ratings),
+                     render_mode=render_mode(len(rating_df)))
+    if rating_buttons:
+        fig.update_layout({'updatemenus':[{'type': 'dropdown','x': 1.3,'y': 1,'showactive': True,'active': 0,'buttons': rating_buttons}]})
+    fig.update_xaxes(rangeslider_visible=True)
+    fig.update_layout(title="Netflix Movies' PG-rating and their IMDB score ")
+    fig.update_layout(width=1000, height=1000)
+    return fig
+
+
+fig = cached_figure("rating scatter", [rating_df[['Date', 'IMDB Score', 'rating']]], rating_scatter,
+                    {"buttons": bool(rating_buttons)})
 st.plotly_chart(fig)
-fig.show()
 
 
 # In[65]:
@@ -776,14 +896,11 @@ rating, because the different rating groups are spread out around the plot.
 # In[71]:
 
 
-code = '''netflix_df['quarter'] = pd.PeriodIndex(netflix_df.Date, freq='Q')
-
-quarter_close_med = netflix_df.groupby('quarter')['Close'].median()
-quarter_imdb_med = netflix_df.groupby('quarter')['IMDB Score'].median()
-
-quarter = pd.concat([quarter_close_med, quarter_imdb_med], axis=1, join='inner')
+code = '''# The medians per quarter come from the rollup cube, only the quarters with premieres are kept
+quarter = rollup_table(load_rollups(), 'quarter', stat='median', metrics=['Close', 'IMDB Score'])
+quarter = quarter.dropna(subset=['IMDB Score'])
 quarter['Percentage Change'] = quarter['Close'].pct_change() * 100
-quarter['Quarter'] = quarter.index.to_timestamp()
+quarter['Quarter'] = bucket_start(quarter.index, 'quarter')
 
 fig = px.line(data_frame=quarter, x='Quarter', y='IMDB Score', 
               labels={
@@ -800,24 +917,28 @@ st.code(code, language='python')
 # In[70]:
 
 
-netflix_df['quarter'] = pd.PeriodIndex(netflix_df.Date, freq='Q')
+# The medians per quarter come from the rollup cube (see rollups.py), which has the
+# median, mean, min, max and count of the Close price and IMDB Score per day, week, month,
+# quarter and year. Only the quarters with premieres are kept
+quarter = rollup_table(load_rollups(), 'quarter', stat='median', metrics=['Close', 'IMDB Score'])
+quarter = quarter.dropna(subset=['IMDB Score'])
+quarter['Percentage Change'] = quarter['Close'].pct_change() * 100
+quarter['Quarter'] = bucket_start(quarter.index, 'quarter')
 
-quarter_close_med = netflix_df.groupby('quarter')['Close'].median()
-quarter_imdb_med = netflix_df.groupby('quarter')['IMDB Score'].median()
 
-quarter = pd.concat([quarter_close_med, quarter_imdb_med], axis=1, join='inner')
-quarter['Percentage Change'] = quarter['Close'].pct_change() * 100
-quarter['Quarter'] = quarter.index.to_timestamp()
+def quarter_line():
+    fig = px.line(data_frame=quarter, x='Quarter', y='IMDB Score', 
+                  labels={
+                         "Quarter": "Date",
+                         "IMDB Score": "Median IMDB Score",
+                         "species": "Species of Iris"
+                     },
+                    title="Median IMDB Score of Netflix Originals through the years")
+    return fig
 
-fig = px.line(data_frame=quarter, x='Quarter', y='IMDB Score', 
-              labels={
-                     "Quarter": "Date",
-                     "IMDB Score": "Median IMDB Score",
-                     "species": "Species of Iris"
-                 },
-                title="Median IMDB Score of Netflix Originals through the years")
+
+fig = cached_figure("quarter line", [quarter[['Quarter', 'IMDB Score']]], quarter_line)
 st.plotly_chart(fig)
-fig.show()
 
 
 # In[ ]:
@@ -830,6 +951,98 @@ is a downward trend of the IMDB scores of the Netflix movies.''')
 # In[ ]:
 
 
+st.header('''Stock reaction around the premieres''')
+
+
+# In[ ]:
+
+
+st.text('''
+A single Open - Close difference on the premiere day can't tell if a premiere moves
+the stock. For every premiere we take the daily returns from 5 trading days before to
+5 trading days after the premiere, and subtract the mean daily return of the 60 days
+before that window. Adding up these abnormal returns gives the cumulative abnormal
+return (CAR), which we average over all premieres.
+ ''')
+
+
+# In[ ]:
+
+
+code = '''from event_study import average_car
+
+car = average_car(load_event_study())
+car["Day"] = car.index
+
+fig = px.line(car, x="Day", y="Mean CAR", error_y="Standard Error",
+              labels={"Day": "Trading days from the premiere",
+                      "Mean CAR": "Mean cumulative abnormal return"},
+              title="Mean cumulative abnormal return around Netflix premieres")
+st.plotly_chart(fig)'''
+st.code(code, language="python")
+
+
+# In[ ]:
+
+
+from event_study import average_car
+from netflix_data import load_event_study
+
+car = average_car(load_event_study())
+car["Day"] = car.index
+
+
+def car_line():
+    fig = px.line(car, x="Day", y="Mean CAR", error_y="Standard Error",
+                  labels={"Day": "Trading days from the premiere",
+                          "Mean CAR": "Mean cumulative abnormal return"},
+                  title="Mean cumulative abnormal return around Netflix premieres")
+    fig.update_layout(width=1000, height=1000)
+    return fig
+
+
+fig = cached_figure("car line", [car[["Day", "Mean CAR", "Standard Error"]]], car_line)
+st.plotly_chart(fig)
+
+
+# In[ ]:
+
+
+st.header('''Testing the correlations''')
+
+
+# In[ ]:
+
+
+st.text('''
+So far we judged the correlations by eye from the scatter plots. Now we compute the
+correlation of the IMDB Score, Runtime, PG-Rating (as the minimum age) and the biggest
+Genres with the stock features of the premiere day. A permutation test with 10.000
+shuffles gives the p-value of every correlation, and 10.000 bootstrap resamples give
+its 95% confidence interval.
+ ''')
+
+
+# In[ ]:
+
+
+code = '''correlations = load_correlations()
+st.dataframe(correlations.sort_values("p-value"))'''
+st.code(code, language="python")
+
+
+# In[ ]:
+
+
+from netflix_data import load_correlations
+
+correlations = load_correlations()
+st.dataframe(correlations.sort_values("p-value"))
+
+
+# In[ ]:
+
+
 st.header("Main takeaways")
 
 
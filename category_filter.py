@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Filter a figure on the categories of a column.
+
+A figure colored by a column has one trace per category. The categories
+and the category of every row come from one ``pd.factorize`` of the
+column, and the figure is built with the categories in that order
+(``category_orders``), so category i is trace i. With few categories the
+whole figure is sent once and a dropdown switches the visibility of the
+traces in the browser. With many categories the rows are filtered on the
+server and only the selected category is sent.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# With more categories than this the figure is filtered on the server
+CLIENT_FILTER_MAX_CATEGORIES = 12
+
+# Label of the filter that shows every category
+ALL = "All"
+
+
+def category_index(values):
+    """Return the sorted categories of a column and the category code of every row.
+
+    Missing values get code -1 and are not a category.
+    """
+    codes, categories = pd.factorize(pd.Series(values).astype(object), sort=True)
+    return {"categories": [str(category) for category in categories], "codes": codes}
+
+
+def category_orders(column, index):
+    """The ``category_orders`` for plotly express, so category i becomes trace i."""
+    return {column: index["categories"]}
+
+
+def visibility_buttons(index, title=None):
+    """Dropdown buttons that show all traces, or the trace of one category.
+
+    ``title`` is a format string for the figure title with the label of the
+    button, the title isn't changed when it is None.
+    """
+    n = len(index["categories"])
+    visible = np.vstack([np.ones((1, n), dtype=bool), np.eye(n, dtype=bool)])
+    buttons = []
+    for label, row in zip([ALL] + index["categories"], visible.tolist()):
+        args = [{"visible": row}]
+        if title is not None:
+            args.append({"title": title % label})
+        buttons.append({"label": label, "method": "update", "args": args})
+    return buttons
+
+
+def filter_rows(df, index, category):
+    """The rows of ``df`` in ``category``, all rows for ``ALL``.
+
+    ``index`` is the ``category_index`` of the column of ``df``.
+    """
+    if category == ALL:
+        return df
+    return df[index["codes"] == index["categories"].index(category)]
+
+
+def client_side(index, max_categories=CLIENT_FILTER_MAX_CATEGORIES):
+    """Whether the figure of these categories is small enough to filter in the browser."""
+    return len(index["categories"]) <= max_categories
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Chart data preparation for the plotly figures of the blog.
+
+Categorical charts get one row per category, aggregated on the server,
+instead of one row per movie that plotly would stack in the browser. The
+size of the figure then depends on the number of categories, not on the
+number of rows.
+
+Line charts are downsampled to the pixel width of the figure, with
+Largest-Triangle-Three-Buckets or the min/max per pixel column, and large
+traces switch to WebGL. Scatter plots with more points than the screen can
+show are binned into a density grid per color and drawn as heatmaps.
+"""
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from pandas.api.types import is_categorical_dtype
+
+
+def category_counts(df, column, sort=True):
+    """Count the rows per category of a column.
+
+    Categorical columns are counted with ``np.bincount`` over their codes,
+    other columns with ``value_counts``. Returns a Dataframe with the
+    category column and a "count" column, with the largest count first when
+    ``sort`` is True. Missing values and unused categories are left out.
+    """
+    values = df[column]
+    if is_categorical_dtype(values):
+        codes = values.cat.codes.values
+        counts = np.bincount(codes[codes >= 0], minlength=len(values.cat.categories))
+        result = pd.DataFrame({column: values.cat.categories.astype(object), "count": counts})
+        result = result[result["count"] > 0]
+    else:
+        counts = values.value_counts(sort=False)
+        result = pd.DataFrame({column: counts.index, "count": counts.values})
+
+    if sort:
+        result = result.sort_values("count", ascending=False, kind="mergesort")
+    return result.reset_index(drop=True)
+
+
+def category_totals(df, column, value, agg="sum", sort=True):
+    """Aggregate a value column per category (``agg`` is any groupby aggregation).
+
+    Returns a Dataframe with the category column and the aggregated value
+    column, with the largest value first when ``sort`` is True.
+    """
+    totals = df.groupby(column, observed=True, sort=False)[value].agg(agg)
+    result = totals.reset_index()
+    result[column] = result[column].astype(object)
+    if sort:
+        result = result.sort_values(value, ascending=False, kind="mergesort")
+    return result.reset_index(drop=True)
+
+
+def first_row_styles(df, column, categories, styles, default=None):
+    """The style of the first row of every category, like plotly.js picks it for a pie.
+
+    A pie with one value per row takes the per-slice styles of a label (like
+    ``pull`` and ``marker.colors``) from the first row with that label. With
+    one value per category (see ``category_totals``) this gives every slice
+    the style it had in the pie of the rows, whatever the order of the
+    categories. Rows past the end of ``styles`` get ``default``.
+    """
+    keys = df[column].astype(object).values
+    first = pd.Series(np.arange(len(keys)), index=keys)
+    first = first[~first.index.duplicated(keep="first")]
+    return [styles[position] if position < len(styles) else default
+            for position in first.loc[list(categories)].values]
+
+
+# Pixel width of the figures in the blog, a line needs no more points than this
+PIXEL_WIDTH = 1000
+
+# Traces with more points than this are drawn with WebGL instead of SVG
+WEBGL_POINT_THRESHOLD = 1000
+
+
+def render_mode(n_points):
+    """The plotly express ``render_mode`` for a trace of ``n_points`` points."""
+    return "webgl" if n_points > WEBGL_POINT_THRESHOLD else "svg"
+
+
+def _as_numbers(values):
+    values = np.asarray(values)
+    if values.dtype.kind == "M":
+        return values.astype("datetime64[ns]").astype(np.int64).astype(np.float64)
+    return values.astype(np.float64)
+
+
+def lttb_indices(x, y, n_out):
+    """Pick ``n_out`` points of a line with Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept, and the points in between are split
+    in ``n_out - 2`` buckets. Of every bucket the point that forms the largest
+    triangle with the point picked in the bucket before and the mean of the
+    bucket after is kept, so peaks and dips survive. ``x`` must be sorted.
+    Returns the positions of the points to keep.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x, y = _as_numbers(x), _as_numbers(y)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+
+    picked = np.empty(n_out, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for bucket in range(n_out - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        next_lo, next_hi = (edges[bucket + 1], edges[bucket + 2]) if bucket + 2 < len(edges) \
+            else (n - 1, n)
+        mean_x, mean_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        area = np.abs((x[a] - mean_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (mean_y - y[a]))
+        a = lo + int(np.argmax(area))
+        picked[bucket + 1] = a
+    return picked
+
+
+def minmax_indices(y, n_buckets):
+    """Keep the lowest and highest point of each of ``n_buckets`` equal buckets.
+
+    Fully vectorized: one sort on (bucket, y) finds both ends of every
+    bucket. Returns the sorted positions of the points to keep.
+    """
+    n = len(y)
+    if 2 * n_buckets >= n:
+        return np.arange(n)
+    y = _as_numbers(y)
+    bucket = np.arange(n) * n_buckets // n
+    order = np.lexsort((y, bucket))
+    starts = np.searchsorted(bucket[order], np.arange(n_buckets), side="left")
+    ends = np.append(starts[1:], n) - 1
+    return np.unique(np.concatenate([order[starts], order[ends]]))
+
+
+def downsample(df, x, y, max_points=PIXEL_WIDTH, method="lttb"):
+    """Reduce the rows of a line chart to ``max_points``, keeping its shape.
+
+    ``df`` must be sorted on ``x``. ``method`` is "lttb" or "minmax" (the
+    lowest and highest point per pixel column). Rows with a missing ``y``
+    are left out.
+    """
+    df = df[df[y].notna()]
+    if len(df) <= max_points:
+        return df
+    if method == "lttb":
+        rows = lttb_indices(df[x].values, df[y].values, max_points)
+    elif method == "minmax":
+        rows = minmax_indices(df[y].values, max_points // 2)
+    else:
+        raise ValueError("method must be 'lttb' or 'minmax', not %r" % (method,))
+    return df.iloc[rows]
+
+
+def select_range(df, column, start=None, end=None):
+    """Rows of a Dataframe sorted on ``column`` between ``start`` and ``end`` (inclusive).
+
+    A binary search on the sorted column, so zooming in only touches the
+    rows that are shown.
+    """
+    values = df[column].values
+    lo = 0 if start is None else np.searchsorted(values, np.asarray(start, dtype=values.dtype),
+                                                  side="left")
+    hi = len(df) if end is None else np.searchsorted(values, np.asarray(end, dtype=values.dtype),
+                                                      side="right")
+    return df.iloc[lo:hi]
+
+
+# Scatter plots with more points than this are drawn as density grids
+RASTER_POINT_THRESHOLD = 50000
+
+# Cells of the density grid along x and y
+RASTER_BINS = (250, 250)
+
+
+def _bin_positions(values, bins, lo, hi):
+    span = hi - lo if hi > lo else 1.0
+    return np.clip(((values - lo) / span * bins).astype(np.int64), 0, bins - 1)
+
+
+def density_grid(df, x, y, color=None, bins=RASTER_BINS):
+    """Count the points of a scatter plot per cell of a 2-D grid, per color category.
+
+    All categories are binned at once with one ``np.bincount`` over a
+    combined (category, y cell, x cell) index. Rows with a missing x or y
+    are left out. Returns a dict with the "categories", the "counts" as a
+    (categories x y bins x x bins) array, and the cell centers "x" and "y".
+    """
+    xs, ys = _as_numbers(df[x].values), _as_numbers(df[y].values)
+    valid = ~(np.isnan(xs) | np.isnan(ys))
+    xs, ys = xs[valid], ys[valid]
+    if color is None:
+        codes, categories = np.zeros(len(xs), dtype=np.int64), np.array([None], dtype=object)
+    else:
+        codes, categories = pd.factorize(df[color].values[valid])
+        codes = np.where(codes < 0, len(categories), codes)
+        if (codes == len(categories)).any():
+            categories = np.append(np.asarray(categories, dtype=object), None)
+
+    nx, ny = bins
+    x_lo, x_hi = (xs.min(), xs.max()) if len(xs) else (0.0, 1.0)
+    y_lo, y_hi = (ys.min(), ys.max()) if len(ys) else (0.0, 1.0)
+    rows = codes * ny + _bin_positions(ys, ny, y_lo, y_hi)
+    cells = rows * nx + _bin_positions(xs, nx, x_lo, x_hi)
+    counts = np.bincount(cells, minlength=len(categories) * ny * nx)
+    counts = counts.reshape(len(categories), ny, nx)
+
+    x_centers = x_lo + (np.arange(nx) + 0.5) * ((x_hi - x_lo) / nx)
+    y_centers = y_lo + (np.arange(ny) + 0.5) * ((y_hi - y_lo) / ny)
+    if df[x].dtype.kind == "M":
+        x_centers = x_centers.astype(np.int64).astype("datetime64[ns]")
+    if df[y].dtype.kind == "M":
+        y_centers = y_centers.astype(np.int64).astype("datetime64[ns]")
+    return {"categories": list(categories), "counts": counts, "x": x_centers, "y": y_centers}
+
+
+def density_trace(grid, colours=px.colors.qualitative.Plotly):
+    """One heatmap trace of a density grid, a cell has the colour of its largest category.
+
+    The trace has one value per cell whatever the number of categories, and
+    empty cells are transparent. The hover text of a cell names the largest
+    category and the number of points.
+    """
+    counts = grid["counts"]
+    k = len(grid["categories"])
+    names = np.array(["" if category is None else str(category) for category in grid["categories"]],
+                     dtype=object)
+    totals = counts.sum(axis=0)
+    dominant = counts.argmax(axis=0)
+    filled = totals > 0
+
+    # Category i gets the band [i / k, (i + 1) / k] of the colour scale, z is its middle
+    z = np.where(filled, (dominant + 0.5) / k, np.nan)
+    colourscale = []
+    for i in range(k):
+        colour = colours[i % len(colours)]
+        colourscale += [[i / k, colour], [(i + 1) / k, colour]]
+
+    text = np.full(totals.shape, "", dtype=object)
+    text[filled] = names[dominant[filled]] + ": " + counts.max(axis=0)[filled].astype(str) \
+        + " of " + totals[filled].astype(str) + " points"
+    return go.Heatmap(x=grid["x"], y=grid["y"], z=z, zmin=0, zmax=1, text=text,
+                      colorscale=colourscale, hoverongaps=False,
+                      hovertemplate="%{x}, %{y}<br>%{text}<extra></extra>",
+                      colorbar={"tickvals": (np.arange(k) + 0.5) / k, "ticktext": list(names)})
+
+
+def scatter_figure(df, x, y, color=None, threshold=RASTER_POINT_THRESHOLD, bins=RASTER_BINS,
+                   title=None, labels=None, **kwargs):
+    """A ``px.scatter`` of the rows, or a density grid when there are more than ``threshold``.
+
+    Above the threshold the cost of the figure depends on the number of grid
+    cells, not on the number of rows. Other keyword arguments are passed to
+    ``px.scatter``; WebGL is used for large scatter plots.
+    """
+    if len(df) <= threshold:
+        return px.scatter(df, x=x, y=y, color=color, title=title, labels=labels,
+                          render_mode=render_mode(len(df)), **kwargs)
+
+    labels = labels or {}
+    fig = go.Figure(density_trace(density_grid(df, x, y, color, bins)))
+    fig.update_layout(title=title, xaxis_title=labels.get(x, x), yaxis_title=labels.get(y, y))
+    return fig
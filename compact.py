@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Compact dtypes for the merged Netflix Dataframe.
+
+Text columns with few unique values become categoricals, float columns
+become float32 when that doesn't change the values beyond display
+precision, and whole-number columns (like Volume) become the smallest
+integer type that fits.
+"""
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_categorical_dtype, is_float_dtype, is_integer_dtype
+
+
+# Text columns with fewer unique values than this share of the rows become categoricals
+CATEGORY_MAX_RATIO = 0.5
+
+# Largest relative error float32 may introduce, far below the precision we display
+FLOAT32_RTOL = 1e-6
+
+
+def memory_usage(df):
+    """Return the memory of a Dataframe in bytes, including the Python strings."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def _fits_float32(values):
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return True
+    if np.abs(values).max() > np.finfo(np.float32).max:
+        return False
+    error = np.abs(values.astype(np.float32).astype(np.float64) - values)
+    return bool((error <= FLOAT32_RTOL * np.abs(values)).all())
+
+
+def encode_category(column, max_ratio=CATEGORY_MAX_RATIO):
+    """Return a text column as a categorical when it has few unique values."""
+    if column.dtype == object and column.nunique() <= max_ratio * len(column):
+        return column.astype("category")
+    return column
+
+
+def compact_column(column):
+    """Return a column with the most compact dtype that keeps its values."""
+    if is_categorical_dtype(column):
+        return column.cat.remove_unused_categories()
+
+    if column.dtype == object:
+        return encode_category(column)
+
+    if is_float_dtype(column):
+        values = column.values.astype(np.float64)
+        finite = values[~np.isnan(values)]
+        # Whole numbers (like Volume, stored as float in the CSV) become integers
+        if len(finite) == len(values) and len(values) and (finite == np.round(finite)).all():
+            return pd.to_numeric(column.astype(np.int64), downcast="integer")
+        if _fits_float32(values):
+            return column.astype(np.float32)
+        return column
+
+    if is_integer_dtype(column):
+        return pd.to_numeric(column, downcast="integer")
+
+    return column
+
+
+def compact_dtypes(df):
+    """Compact the dtypes of every column of a Dataframe.
+
+    Returns the compacted Dataframe and a report dict with the memory in
+    bytes before and after.
+    """
+    before = memory_usage(df)
+    df = pd.DataFrame({column: compact_column(df[column]) for column in df.columns},
+                      index=df.index)
+    report = {"memory before": before, "memory after": memory_usage(df)}
+    return df, report
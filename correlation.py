@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Correlations between the movie features and the stock features, with significance.
+
+All pairs are computed at once as one matrix product of standardized
+columns. Every correlation gets a permutation test p-value (the stock rows
+are shuffled against the movie rows) and a bootstrap confidence interval
+(rows are resampled with replacement). The resamples are drawn as index
+matrices and computed in chunks with one ``einsum`` each, and the chunks
+are spread over a process pool.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+RESAMPLES = 10000
+
+# Resamples per chunk, a chunk holds CHUNK_SIZE x rows x columns floats
+CHUNK_SIZE = 500
+
+CONFIDENCE = 0.95
+
+# PG-ratings ordered by the minimum age of the audience, "U" (unknown) has no age
+RATING_AGES = {"G": 0, "TV-Y": 0, "TV-G": 0, "TV-Y7": 7, "TV-Y7-FV": 7, "PG": 10, "TV-PG": 10,
+               "PG-13": 13, "TV-14": 14, "R": 17, "TV-MA": 17, "NC-17": 18}
+
+# Genres with fewer movies than this don't get their own column
+MIN_GENRE_COUNT = 20
+
+# Stock features of the premiere day we correlate the movie features with
+STOCK_FEATURES = ["Close", "Return", "Drawdown", "Volatility 20d", "ATR 20d"]
+
+
+def movie_features(netflix_df, min_genre_count=MIN_GENRE_COUNT):
+    """Numeric movie features: IMDB Score, Runtime, the rating age and a 0/1 column per genre."""
+    features = pd.DataFrame({"IMDB Score": netflix_df["IMDB Score"].astype(np.float64),
+                             "Runtime": netflix_df["Runtime"].astype(np.float64),
+                             "Rating Age": netflix_df["rating"].astype(object).map(RATING_AGES)
+                             .astype(np.float64)})
+    genres = netflix_df["Genre"].astype(object)
+    counts = genres.value_counts()
+    for genre in counts.index[counts >= min_genre_count]:
+        features["Genre: %s" % genre] = (genres == genre).astype(np.float64)
+    return features
+
+
+def _standardize(values, axis):
+    centered = values - values.mean(axis=axis, keepdims=True)
+    scale = np.sqrt((centered ** 2).sum(axis=axis, keepdims=True))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return centered / scale
+
+
+def correlation_matrix(x, y):
+    """Pearson correlation of every column of x with every column of y (complete rows)."""
+    return _standardize(x, 0).T @ _standardize(y, 0)
+
+
+def _permutation_chunk(args):
+    # Count how often a shuffled correlation is at least as extreme as the observed one
+    zx, zy, observed, size, seed = args
+    rng = np.random.default_rng(seed)
+    orders = np.argsort(rng.random((size, zy.shape[0])), axis=1)
+    shuffled = np.einsum("np,bnq->bpq", zx, zy[orders])
+    return (np.abs(shuffled) >= np.abs(observed) - 1e-12).sum(axis=0)
+
+
+def _bootstrap_chunk(args):
+    # Correlations of rows resampled with replacement, standardized per resample
+    x, y, size, seed = args
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, x.shape[0], (size, x.shape[0]))
+    return np.einsum("bnp,bnq->bpq", _standardize(x[rows], 1), _standardize(y[rows], 1))
+
+
+def correlation_tests(x, y, resamples=RESAMPLES, confidence=CONFIDENCE, n_jobs=None, seed=0):
+    """Correlate every column of x with every column of y, with p-values and confidence intervals.
+
+    ``x`` and ``y`` are Dataframes with the same rows, rows with a missing
+    value are left out. ``n_jobs`` is the size of the process pool (default
+    the number of CPUs, 1 runs in this process). Returns a Dataframe with a
+    row per pair: the correlation "r", the permutation test "p-value", the
+    bootstrap confidence interval ("ci low", "ci high") and the number of
+    rows "n".
+    """
+    complete = x.notna().all(axis=1).values & y.notna().all(axis=1).values
+    xv = x.values[complete].astype(np.float64)
+    yv = y.values[complete].astype(np.float64)
+    observed = correlation_matrix(xv, yv)
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+
+    # One seed per chunk, so the result doesn't depend on the number of processes
+    sizes = [min(CHUNK_SIZE, resamples - start) for start in range(0, resamples, CHUNK_SIZE)]
+    seeds = np.random.SeedSequence(seed).spawn(2 * len(sizes))
+    zx, zy = _standardize(xv, 0), _standardize(yv, 0)
+    permutation_tasks = [(zx, zy, observed, size, s) for size, s in zip(sizes, seeds)]
+    bootstrap_tasks = [(xv, yv, size, s) for size, s in zip(sizes, seeds[len(sizes):])]
+
+    if n_jobs == 1:
+        extreme = sum(map(_permutation_chunk, permutation_tasks))
+        boots = np.concatenate(list(map(_bootstrap_chunk, bootstrap_tasks)))
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            permutations = pool.map(_permutation_chunk, permutation_tasks)
+            bootstraps = pool.map(_bootstrap_chunk, bootstrap_tasks)
+            extreme = sum(permutations)
+            boots = np.concatenate(list(bootstraps))
+
+    alpha = (1 - confidence) / 2
+    low, high = np.nanquantile(boots, [alpha, 1 - alpha], axis=0)
+    p_values = (extreme + 1) / (resamples + 1)
+
+    pairs = pd.MultiIndex.from_product([x.columns, y.columns], names=["x", "y"])
+    return pd.DataFrame({"r": observed.ravel(), "p-value": p_values.ravel(),
+                         "ci low": low.ravel(), "ci high": high.ravel(),
+                         "n": int(complete.sum())}, index=pairs).reset_index()
+
+
+def premiere_correlations(netflix_df, **kwargs):
+    """Test the correlations of the movie features with the stock features of the premieres.
+
+    Keyword arguments are passed to ``correlation_tests``.
+    """
+    return correlation_tests(movie_features(netflix_df), netflix_df[STOCK_FEATURES], **kwargs)
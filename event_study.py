@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Event study of the stock reaction around premieres.
+
+For every event (the trading day of a premiere) the daily returns from k
+trading days before to k trading days after are cut out of the return
+series with index arithmetic: one (events x window) matrix of positions,
+no loop per premiere. The abnormal return is the return minus the expected
+return, the mean daily return of the estimation window that ends right
+before the event window. The cumulative abnormal return (CAR) adds up the
+abnormal returns from the start of the window.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# Trading days before and after the event, and length of the estimation window
+EVENT_WINDOW = 5
+ESTIMATION_WINDOW = 60
+
+
+def window_matrix(values, positions, k):
+    """Cut the values from k before to k after every position, as an (events x 2k+1) matrix.
+
+    Positions outside of ``values`` (including -1, no trading day) give NaN.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    positions = np.asarray(positions)
+    offsets = np.arange(-k, k + 1)
+    index = positions[:, None] + offsets[None, :]
+    valid = (index >= 0) & (index < len(values)) & (positions >= 0)[:, None]
+    matrix = values[np.clip(index, 0, len(values) - 1)]
+    matrix[~valid] = np.nan
+    return matrix
+
+
+def event_study(returns, positions, k=EVENT_WINDOW, estimation_window=ESTIMATION_WINDOW,
+                labels=None):
+    """Compute the returns, abnormal returns and CAR around every event.
+
+    ``returns`` is the daily return series of all trading days, ``positions``
+    the trading day of every event in it (-1 for none). Returns a dict of
+    Dataframes with one row per event (indexed by ``labels``) and one column
+    per day offset from -k to k: "returns", "abnormal" and "car". "expected"
+    is the expected daily return per event.
+    """
+    returns = pd.Series(np.asarray(returns, dtype=np.float64))
+    positions = np.asarray(positions)
+
+    # Mean return of the estimation window [-k - L, -k - 1], for every trading day at once
+    baseline = returns.rolling(estimation_window).mean().shift(k + 1).values
+    expected = np.where(positions >= 0, baseline[np.clip(positions, 0, None)], np.nan)
+
+    window = window_matrix(returns.values, positions, k)
+    abnormal = window - expected[:, None]
+    car = np.cumsum(np.nan_to_num(abnormal), axis=1)
+    car[np.isnan(abnormal)] = np.nan
+
+    offsets = np.arange(-k, k + 1)
+    index = pd.Index(labels) if labels is not None else None
+
+    def frame(matrix):
+        return pd.DataFrame(matrix, index=index, columns=offsets)
+
+    return {"returns": frame(window),
+            "abnormal": frame(abnormal),
+            "car": frame(car),
+            "expected": pd.Series(expected, index=index)}
+
+
+def average_car(study):
+    """Mean CAR and its standard error per day offset, over all events."""
+    car = study["car"]
+    return pd.DataFrame({"Mean CAR": car.mean(),
+                         "Standard Error": car.std() / np.sqrt(car.count())})
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Process wide cache of built plotly figures.
+
+Building a figure with plotly express costs far more than hashing the data
+it is built from. A figure is cached as the ``go.Figure`` that was built,
+keyed on a fingerprint of the input Dataframes and the figure parameters,
+so a rerun with the same data hands the validated figure to
+``st.plotly_chart``. Given a dict, Streamlit would build and validate a
+``go.Figure`` from it on every rerun. The least recently used figures are
+dropped when the JSON of the cached figures grows over the byte budget.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+
+# Bytes of figure JSON the cache keeps
+FIGURE_CACHE_BYTES = 64 * 1024 * 1024
+
+# Figure key -> (figure, size of its JSON in bytes), least recently used first
+_figures = OrderedDict()
+_figures_bytes = 0
+_figures_lock = threading.RLock()
+
+
+def frame_fingerprint(df):
+    """Hash of the columns, dtypes and values of a Dataframe."""
+    digest = hashlib.sha1()
+    digest.update(repr([(str(column), str(dtype)) for column, dtype in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+def figure_key(name, frames, params=None):
+    """Key of a figure: its name, the fingerprint of every input frame and its parameters."""
+    digest = hashlib.sha1(name.encode())
+    for df in frames:
+        digest.update(frame_fingerprint(df).encode())
+    digest.update(repr(sorted((params or {}).items())).encode())
+    return digest.hexdigest()
+
+
+def cached_figure(name, frames, build, params=None):
+    """Return a figure, and only build it when its data or parameters changed.
+
+    ``build`` returns a plotly figure, it is called without arguments, so it
+    should only use ``frames`` and ``params``. The figure is shared by every
+    session, pass it to ``st.plotly_chart`` without changing it. A figure
+    whose JSON is larger than the byte budget is returned but not cached.
+    """
+    global _figures_bytes
+    key = figure_key(name, frames, params)
+    with _figures_lock:
+        entry = _figures.get(key)
+        if entry is not None:
+            _figures.move_to_end(key)
+            return entry[0]
+
+    fig = build()
+    size = len(fig.to_json().encode("utf-8"))
+    with _figures_lock:
+        if key not in _figures and size <= FIGURE_CACHE_BYTES:
+            _figures[key] = (fig, size)
+            _figures_bytes += size
+            while _figures_bytes > FIGURE_CACHE_BYTES:
+                _, (_, dropped) = _figures.popitem(last=False)
+                _figures_bytes -= dropped
+    return fig
+
+
+def clear_figures():
+    """Drop every cached figure."""
+    global _figures_bytes
+    with _figures_lock:
+        _figures.clear()
+        _figures_bytes = 0
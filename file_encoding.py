@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Encoding manifest for the CSV files in data/.
+
+The detected encoding of every file is stored in a sidecar manifest
+(``.encodings.json`` next to the file), keyed by a hash of the file content.
+A file is only read again when its mtime or size changed, and chardet only
+runs when the content hash is not in the manifest yet and the cheap checks
+(byte order mark, strict UTF-8 decoding) can't decide. The hash and the
+checks are done in one pass over the chunks of the file.
+
+A file that grows at the end (like the stock prices) keeps the encoding of
+the manifest when the part the manifest knows still hashes the same, and
+only the appended bytes are checked.
+"""
+
+import codecs
+import hashlib
+import json
+import os
+import threading
+
+
+MANIFEST_NAME = ".encodings.json"
+
+# Byte order marks, longest first so UTF-32 isn't mistaken for UTF-16
+BOMS = [(codecs.BOM_UTF32_LE, "utf-32"),
+        (codecs.BOM_UTF32_BE, "utf-32"),
+        (codecs.BOM_UTF8, "utf-8-sig"),
+        (codecs.BOM_UTF16_LE, "utf-16"),
+        (codecs.BOM_UTF16_BE, "utf-16")]
+
+# Number of bytes chardet gets to look at, same as the original loop in the blog
+CHARDET_SAMPLE_SIZE = 100000
+
+# Bytes read at a time, a file is never read into memory as a whole
+CHUNK_SIZE = 1 << 20
+
+_manifest_lock = threading.Lock()
+
+# Results already looked up by this process: (path, mtime, size) -> result
+_known = {}
+
+
+def _manifest_path(path):
+    return os.path.join(os.path.dirname(os.path.abspath(path)), MANIFEST_NAME)
+
+
+def _read_manifest(manifest_path):
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {"hashes": {}, "files": {}}
+    manifest.setdefault("hashes", {})
+    manifest.setdefault("files", {})
+    return manifest
+
+
+def _write_manifest(manifest_path, manifest):
+    # Write to a temporary file first, so a reader never sees half a manifest
+    tmp_path = "%s.%d.tmp" % (manifest_path, os.getpid())
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, manifest_path)
+    except OSError:
+        # A read-only data folder only costs us the detection on the next run
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _chunks(f, size=None):
+    # The chunks of a file from its current position, ``size`` bytes or up to the end
+    while size is None or size > 0:
+        chunk = f.read(CHUNK_SIZE if size is None else min(CHUNK_SIZE, size))
+        if not chunk:
+            break
+        if size is not None:
+            size -= len(chunk)
+        yield chunk
+
+
+def _scan(chunks, digest=None):
+    # One pass over the chunks: update the hash, check ASCII and strict UTF-8 with an
+    # incremental decoder, and keep the first bytes for the BOM and chardet
+    head = b""
+    is_ascii = is_utf8 = True
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="strict")
+    for chunk in chunks:
+        if digest is not None:
+            digest.update(chunk)
+        if len(head) < CHARDET_SAMPLE_SIZE:
+            head += chunk[:CHARDET_SAMPLE_SIZE - len(head)]
+        is_ascii = is_ascii and chunk.isascii()
+        if is_utf8 and not is_ascii:
+            try:
+                decoder.decode(chunk)
+            except UnicodeDecodeError:
+                is_utf8 = False
+    if is_utf8:
+        try:
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            is_utf8 = False
+    return {"head": head, "ascii": is_ascii, "utf-8": is_utf8}
+
+
+def _decide(scan):
+    # The encoding of a whole file from its scan
+    for bom, encoding in BOMS:
+        if scan["head"].startswith(bom):
+            return {"encoding": encoding, "confidence": 1.0, "method": "bom"}
+
+    if scan["ascii"]:
+        return {"encoding": "ascii", "confidence": 1.0, "method": "ascii"}
+    if scan["utf-8"]:
+        return {"encoding": "utf-8", "confidence": 1.0, "method": "utf-8"}
+
+    # Import chardet here, so it isn't loaded at all when the manifest is warm
+    import chardet
+    result = chardet.detect(scan["head"])
+    return {"encoding": result["encoding"], "confidence": result["confidence"],
+            "method": "chardet"}
+
+
+def _appended(result, scan):
+    # The encoding of a file with the scanned bytes appended to a part of at least
+    # CHARDET_SAMPLE_SIZE bytes with ``result``, or None when the whole file must be sniffed.
+    # The BOM and the chardet sample are in the part that didn't change.
+    if result["method"] in ("bom", "chardet"):
+        return result
+    if scan["ascii"]:
+        return result
+    if scan["utf-8"]:
+        return {"encoding": "utf-8", "confidence": 1.0, "method": "utf-8"}
+    return None
+
+
+def sniff_encoding(path):
+    """Detect the encoding of a file without the manifest.
+
+    Tries a byte order mark first, then strict ASCII / UTF-8 decoding of the
+    whole file, and only falls back to chardet when both fail. The file is
+    read once, in chunks.
+    """
+    with open(path, "rb") as f:
+        return _decide(_scan(_chunks(f)))
+
+
+def _hash_appended(path, entry, known):
+    # The content hash and encoding of a file that only got bytes appended after the part
+    # the manifest knows, only the new bytes are checked. None when the known part changed.
+    with open(path, "rb") as f:
+        digest = hashlib.blake2b(digest_size=16)
+        for chunk in _chunks(f, entry["size"]):
+            digest.update(chunk)
+        if digest.hexdigest() != entry["hash"]:
+            return None
+        result = _appended(known, _scan(_chunks(f), digest))
+    if result is None:
+        return None
+    return digest.hexdigest(), result
+
+
+def _hash_and_scan(path):
+    # The content hash and the scan of a whole file, in one pass
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        scan = _scan(_chunks(f), digest)
+    return digest.hexdigest(), scan
+
+
+def detect_encoding(path):
+    """Return the encoding of a file as a dict with encoding, confidence and method.
+
+    Uses the manifest next to the file, and updates it when the file is new
+    or changed.
+    """
+    manifest_path = _manifest_path(path)
+    name = os.path.basename(path)
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if key in _known:
+        return _known[key]
+
+    with _manifest_lock:
+        manifest = _read_manifest(manifest_path)
+
+        # Fast path: the file didn't change since the last run
+        entry = manifest["files"].get(name)
+        known = manifest["hashes"].get(entry["hash"]) if entry is not None else None
+        if known is not None and entry["mtime_ns"] == stat.st_mtime_ns \
+                and entry["size"] == stat.st_size:
+            _known[key] = known
+            return known
+
+        # Rows appended to a file that is large enough to hold the BOM and the chardet sample
+        appended = None
+        if known is not None and CHARDET_SAMPLE_SIZE <= entry["size"] < stat.st_size:
+            appended = _hash_appended(path, entry, known)
+        if appended is not None:
+            digest, result = appended
+        else:
+            # The file was touched, but its content may still be known
+            digest, scan = _hash_and_scan(path)
+            result = manifest["hashes"].get(digest)
+            if result is None:
+                result = _decide(scan)
+        manifest["hashes"][digest] = result
+
+        manifest["files"][name] = {"mtime_ns": stat.st_mtime_ns,
+                                   "size": stat.st_size,
+                                   "hash": digest}
+        _write_manifest(manifest_path, manifest)
+        _known[key] = result
+        return result
+
+
+def encoding_of(path):
+    """Return the encoding name of a file, for the encoding parameter of Pandas."""
+    return detect_encoding(path)["encoding"]
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Join helpers for the Netflix datasets."""
+
+import numpy as np
+import pandas as pd
+
+
+ASOF_DIRECTIONS = ("backward", "forward", "nearest")
+
+
+def asof_positions(keys, values, direction="backward", tolerance=None):
+    """Find for every value the position of the matching key with a binary search.
+
+    ``keys`` must be sorted ascending. ``direction`` picks the last key at or
+    before the value ("backward"), the first key at or after it ("forward"),
+    or the closest of the two ("nearest"). Positions without a match, or
+    further away than ``tolerance``, are -1.
+    """
+    if direction not in ASOF_DIRECTIONS:
+        raise ValueError("direction must be one of %s, not %r" % (ASOF_DIRECTIONS, direction))
+    keys = np.asarray(keys)
+    values = np.asarray(values)
+    n = len(keys)
+
+    before = np.searchsorted(keys, values, side="right") - 1
+    after = np.searchsorted(keys, values, side="left")
+    if direction == "backward":
+        positions = before
+    elif direction == "forward":
+        positions = after
+    else:
+        # Compare the distance to both neighbours, ties go to the earlier key
+        before_distance = values - keys[np.clip(before, 0, n - 1)]
+        after_distance = keys[np.clip(after, 0, n - 1)] - values
+        use_after = (before < 0) | ((after < n) & (after_distance < before_distance))
+        positions = np.where(use_after, after, before)
+
+    valid = (positions >= 0) & (positions < n)
+    if values.dtype.kind in "mM":
+        valid &= ~np.isnat(values)
+    if tolerance is not None and n:
+        if values.dtype.kind == "M":
+            tolerance = pd.Timedelta(tolerance).to_timedelta64()
+        distance = np.abs(keys[np.clip(positions, 0, n - 1)] - values)
+        valid &= distance <= tolerance
+    return np.where(valid, positions, -1)
+
+
+def title_keys(titles):
+    """Normalize titles to join keys, for all titles at once.
+
+    The key is casefolded, without accents, without apostrophes, with the
+    other punctuation replaced by a space, and with the whitespace collapsed.
+    "Amélie's  Café: Part-2" becomes "amelies cafe part 2".
+    """
+    keys = titles.astype(str).str.normalize("NFKD")
+    # Drop the combining accents that NFKD split off of their letters
+    keys = keys.str.replace("[\u0300-\u036f]", "", regex=True).str.casefold()
+    keys = keys.str.replace("['’`]", "", regex=True)
+    keys = keys.str.replace(r"[^\w\s]|_", " ", regex=True)
+    keys = keys.str.replace(r"\s+", " ", regex=True).str.strip()
+    return keys.where(titles.notna())
+
+
+# Which row to keep of rows with the same key: the first one, the one with the latest
+# date_added, or a Movie over a TV Show (then the first one)
+DEDUPE_POLICIES = ("first", "latest", "movie")
+
+
+def dedupe_on_key(df, keys, policy="first"):
+    """Keep one row per key of a Dataframe, so a join on the key is one-to-one.
+
+    ``keys`` is a Series of join keys aligned with ``df``. Returns the
+    deduplicated Dataframe (in the original row order) and a report dict with
+    the number of keys that had duplicates and the number of rows dropped.
+    """
+    if policy not in DEDUPE_POLICIES:
+        raise ValueError("policy must be one of %s, not %r" % (DEDUPE_POLICIES, policy))
+    keys = np.asarray(keys, dtype=object)
+
+    # Put the preferred row of every key first, a stable sort keeps the file order otherwise
+    order = np.arange(len(df))
+    if policy == "latest":
+        order = df["date_added"].reset_index(drop=True) \
+            .sort_values(ascending=False, kind="mergesort", na_position="last").index.values
+    elif policy == "movie":
+        order = np.argsort((df["type"] != "Movie").values, kind="stable")
+
+    # Hash based: every row after the first of its key (in preferred order) is dropped
+    ordered_keys = pd.Series(keys[order])
+    dropped = np.zeros(len(df), dtype=bool)
+    dropped[order] = (ordered_keys.duplicated(keep="first") & ordered_keys.notna()).values
+
+    report = {"duplicate keys": pd.Series(keys[dropped]).nunique(),
+              "dropped rows": int(dropped.sum())}
+    return df[~dropped], report
+
+
+def build_title_index(titles):
+    """Build the hash index of a title column: normalized key -> row position.
+
+    A key that occurs more than once points to its first row.
+    """
+    keys = title_keys(titles)
+    positions = pd.Series(np.arange(len(keys)), index=keys.values)
+    positions = positions[positions.index.notna()]
+    return positions[~positions.index.duplicated(keep="first")]
+
+
+def probe_title_index(title_index, titles):
+    """Look up the row positions of titles in a title index, -1 when not found.
+
+    All titles are normalized and probed in one vectorized pass.
+    """
+    hits = title_index.index.get_indexer(title_keys(titles).values)
+    return np.where(hits >= 0, title_index.values[hits], -1)
+
+
+def title_join(left, right, title_index, columns, on="title"):
+    """Left join ``columns`` of ``right`` to ``left`` on the normalized title.
+
+    ``title_index`` is the index of the titles of ``right``, see
+    ``build_title_index``.
+    """
+    positions = probe_title_index(title_index, left[on])
+    matched = right[columns].reset_index(drop=True).reindex(positions).reset_index(drop=True)
+    return pd.concat([left.reset_index(drop=True), matched], axis=1)
+
+
+def title_trigrams(key):
+    """Return the set of character trigrams of a normalized title key."""
+    padded = "  " + key + " "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def build_trigram_index(titles):
+    """Build an inverted index of the character trigrams of a title column.
+
+    Returns a dict with the unique trigrams as a hash ``Index``, and the row
+    positions of the titles that contain each trigram as one flat sorted
+    ``postings`` array with ``offsets`` into it (trigram i owns
+    ``postings[offsets[i]:offsets[i + 1]]``). ``sizes`` holds the number of
+    trigrams of every title.
+    """
+    keys = title_keys(titles).fillna("")
+    grams = [title_trigrams(key) if key else set() for key in keys]
+    sizes = np.array([len(g) for g in grams], dtype=np.int64)
+    rows = np.repeat(np.arange(len(grams)), sizes)
+
+    codes, uniques = pd.factorize(np.array([gram for g in grams for gram in g], dtype=object))
+    order = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes, minlength=len(uniques))
+    return {"grams": pd.Index(uniques),
+            "offsets": np.concatenate([[0], np.cumsum(counts)]),
+            "postings": rows[order],
+            "sizes": sizes}
+
+
+def trigram_candidates(trigram_index, titles, k=5, min_similarity=0.0, max_posting=None):
+    """Find the top ``k`` most similar catalog titles for a batch of titles.
+
+    Similarity is the Jaccard similarity of the trigram sets. Only the
+    postings of the trigrams of the queries are visited, so a lookup doesn't
+    scale with the size of the catalog. Trigrams in more than
+    ``max_posting`` titles (default 5% of the catalog, at least 1000) are too
+    common to tell titles apart and are skipped.
+
+    Returns a Dataframe with the position of the title in ``titles``
+    ("query"), the row position of the candidate in the catalog ("row"), its
+    "similarity" and its "rank", sorted by query and rank.
+    """
+    postings, offsets, sizes = (trigram_index["postings"], trigram_index["offsets"],
+                                trigram_index["sizes"])
+    n_rows = len(sizes)
+    if max_posting is None:
+        max_posting = max(1000, n_rows // 20)
+
+    keys = title_keys(pd.Series(titles)).fillna("")
+    query_grams = [title_trigrams(key) if key else set() for key in keys]
+    query_sizes = np.array([len(g) for g in query_grams], dtype=np.int64)
+    queries = np.repeat(np.arange(len(query_grams)), query_sizes)
+    codes = trigram_index["grams"].get_indexer(
+        np.array([gram for g in query_grams for gram in g], dtype=object))
+
+    # Keep the trigrams that are in the catalog and not too common
+    starts = offsets[np.clip(codes, 0, None)]
+    lengths = offsets[np.clip(codes, 0, None) + 1] - starts
+    keep = (codes >= 0) & (lengths <= max_posting)
+    queries, starts, lengths = queries[keep], starts[keep], lengths[keep]
+
+    # Gather all postings of all queries at once: position j of posting list i is
+    # starts[i] + j, laid out one after the other
+    total = lengths.sum()
+    first = np.cumsum(lengths) - lengths
+    gather = np.repeat(starts - first, lengths) + np.arange(total)
+    pairs = np.repeat(queries, lengths) * n_rows + postings[gather]
+
+    # Shared trigrams per (query, catalog title) pair
+    pairs, shared = np.unique(pairs, return_counts=True)
+    query, row = pairs // n_rows, pairs % n_rows
+    similarity = shared / (query_sizes[query] + sizes[row] - shared)
+
+    keep = similarity >= min_similarity
+    query, row, similarity = query[keep], row[keep], similarity[keep]
+    order = np.lexsort((row, -similarity, query))
+    query, row, similarity = query[order], row[order], similarity[order]
+
+    # Rank within every query, and keep the top k
+    group_start = np.searchsorted(query, query, side="left")
+    rank = np.arange(len(query)) - group_start
+    keep = rank < k
+    return pd.DataFrame({"query": query[keep], "row": row[keep],
+                         "similarity": similarity[keep], "rank": rank[keep]})
@@ -0,0 +1,487 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Load, merge and clean stages of the Netflix blog app.
+
+Every stage is cached at process level, so all Streamlit sessions share one
+copy of the data. A cache entry is keyed on the path, mtime and size of the
+CSV files it was built from, so changing a file on disk invalidates it.
+"""
+
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_categorical_dtype
+
+import correlation
+import event_study
+import rollups
+import stock_analytics
+import stock_ingest
+import stock_store
+import table_pages
+import top_k
+from compact import compact_dtypes
+from file_encoding import encoding_of
+from joins import (build_title_index, build_trigram_index, dedupe_on_key,
+                   title_join, title_keys, trigram_candidates)
+from schema import DATASETS, read_dataset, renamed
+from snapshots import encode_categories, load_snapshot
+
+
+# Folder with the Kaggle datasets
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# Create a dict with file paths
+files = {"NetflixOriginals.csv": os.path.join(DATA_DIR, "NetflixOriginals.csv"),
+         "netflix.csv": os.path.join(DATA_DIR, "netflix.csv"),
+         "netflix1.csv": os.path.join(DATA_DIR, "netflix1.csv")}
+
+# A premiere outside of trading hours gets the prices of the next trading day ("forward"),
+# the first day the stock can react. Use "backward" for the previous trading day.
+STOCK_JOIN_DIRECTION = "forward"
+STOCK_JOIN_TOLERANCE = pd.Timedelta(days=4)
+
+# Which catalog row a title with duplicates in netflix1.csv joins to (see joins.DEDUPE_POLICIES).
+# The Originals are all movies, so a Movie wins over a TV Show with the same title.
+CATALOG_DEDUPE_POLICY = "movie"
+
+# Columns of the datasets that every stage of the app reads, by CSV file. The loaders only
+# parse the union of these, so long text columns like director or listed_in are never read.
+STAGE_COLUMNS = {
+    "title join": {"NetflixOriginals.csv": ["Title"], "netflix1.csv": ["title", "rating"]},
+    "catalog dedupe": {"netflix1.csv": {"first": [], "latest": ["date_added"],
+                                        "movie": ["type"]}[CATALOG_DEDUPE_POLICY]},
+    "stock join": {"NetflixOriginals.csv": ["Premiere"], "netflix.csv": ["Date"]},
+    "table and charts": {"NetflixOriginals.csv": ["Genre", "Runtime", "IMDB Score", "Language"],
+                         "netflix.csv": ["High", "Low", "Open", "Close", "Volume", "Adj Close"]},
+}
+
+# Minimal trigram similarity for a title without an exact match to take the rating of the
+# closest catalog title. Below 0.5 the closest title is mostly a different movie.
+FUZZY_TITLE_MIN_SIMILARITY = 0.5
+
+
+# Process wide cache: stage name -> (file key, result)
+_cache = {}
+_cache_lock = threading.RLock()
+
+
+def file_key(path):
+    """Return the (path, mtime, size) key of a file, without reading it."""
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def cached_stage(name, paths, build):
+    """Return the cached result of a stage, or build it when a file changed.
+
+    Only the newest version of every stage is kept, so an old entry is
+    dropped as soon as one of its files changes.
+    """
+    key = tuple(file_key(path) for path in paths)
+    entry = _cache.get(name)
+    if entry is not None and entry[0] == key:
+        return entry[1]
+
+    with _cache_lock:
+        # Another session may have built the stage while we were waiting
+        entry = _cache.get(name)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        result = build()
+        _cache[name] = (key, result)
+        return result
+
+
+def clear_cache():
+    """Drop every cached stage."""
+    with _cache_lock:
+        _cache.clear()
+
+
+def needed_columns(name):
+    """The CSV columns of a dataset that the stages of the app use, in file order."""
+    needed = set()
+    for stage in STAGE_COLUMNS.values():
+        needed.update(stage.get(name, []))
+    header = pd.read_csv(files[name], nrows=0, encoding=encoding_of(files[name])).columns
+    return [column for column in header if column in needed]
+
+
+def _parse(name, usecols):
+    # Read the dataset with its detected encoding, and parse the dates with the formats
+    # of its schema (the Premiere column of the Originals is renamed to Date). Returns the
+    # Dataframe and the rows whose dates didn't parse
+    return read_dataset(name, files[name], encoding=encoding_of(files[name]), usecols=usecols)
+
+
+def _snapshot(name):
+    # The CSV files are parsed only once, after that they're read from their snapshot.
+    # Only the needed columns are parsed, and read from the snapshot. The rejects of the
+    # parse are kept in a snapshot of their own
+    usecols = needed_columns(name)
+    return load_snapshot(name[:-len(".csv")], files[name], lambda: _parse(name, usecols),
+                         columns=renamed(name, usecols))
+
+
+def _read_originals():
+    return _snapshot("NetflixOriginals.csv")
+
+
+def _read_catalog():
+    df, rejects = _snapshot("netflix1.csv")
+    return compact_dtypes(df)[0], rejects
+
+
+def _read_stock():
+    # The stock prices only grow at the end, so only the appended rows are parsed, and their
+    # rejects are added to the stored ones
+    return stock_ingest.ingest(files["netflix.csv"], encoding=encoding_of(files["netflix.csv"]))
+
+
+# How every dataset is read, as the Dataframe and its rejects
+_READERS = {"NetflixOriginals.csv": _read_originals,
+            "netflix1.csv": _read_catalog,
+            "netflix.csv": _read_stock}
+
+
+def _merge(df, df2, store, features, title_index, trigram_index):
+    # Left Join the rating of the catalog on the normalized title, and the stock data of the
+    # nearest trading day of the premiere, so premieres in the weekend or on a holiday keep
+    # their stock data
+    netflix_df = title_join(df, df2, title_index, ["rating"])
+
+    # Titles that are written differently in the catalog get the rating of the most similar
+    # catalog title, when it is similar enough
+    missing = np.flatnonzero(netflix_df["rating"].isna().values)
+    if len(missing):
+        best = trigram_candidates(trigram_index, netflix_df["title"].values[missing], k=1,
+                                  min_similarity=FUZZY_TITLE_MIN_SIMILARITY)
+        rating = netflix_df["rating"].copy()
+        rating.iloc[missing[best["query"].values]] = df2["rating"].iloc[best["row"].values].values
+        netflix_df["rating"] = rating
+
+    # The trading day is a binary search in the memory-mapped stock store
+    positions = stock_store.lookup(store, netflix_df["Date"].values, STOCK_JOIN_DIRECTION,
+                                   STOCK_JOIN_TOLERANCE)
+    stock = stock_store.to_frame(store, positions).rename(columns={"Date": "Trading Date"})
+
+    # The rolling features line up with the rows of the store, so they join for free
+    stock_features = features.drop(columns=["Date", "Peak"]).reindex(positions) \
+        .reset_index(drop=True)
+    return pd.concat([netflix_df.reset_index(drop=True), stock, stock_features], axis=1)
+
+
+def _clean(netflix_df):
+    netflix_df = netflix_df.sort_values("Date")
+
+    # Fill the NaN values of the rating column with U, and drop the rows without stock data
+    rating = netflix_df["rating"]
+    if is_categorical_dtype(rating) and "U" not in rating.cat.categories:
+        rating = rating.cat.add_categories("U")
+    netflix_df["rating"] = rating.fillna("U")
+    netflix_df = netflix_df.dropna()
+
+    # The difference between the Open and Close price of the premiere day, shown in the table
+    # and the charts of the blog
+    netflix_df["Daily exchange rate difference"] = netflix_df["Open"] - netflix_df["Close"]
+    return netflix_df
+
+
+def _parsed(name):
+    # The Dataframe and the rejects of a dataset, from the one parse the pipeline runs. The
+    # stock prices are served from the stock store instead, see _open_stock_store
+    return cached_stage("parsed " + name, [files[name]], _READERS[name])
+
+
+def _rejects(name):
+    if name == "netflix.csv":
+        return cached_stage("stock rejects", [files[name]], lambda: _read_stock()[1])
+    return _parsed(name)[1]
+
+
+def _originals():
+    return _parsed("NetflixOriginals.csv")[0]
+
+
+def _catalog():
+    return _parsed("netflix1.csv")[0]
+
+
+def _dedupe_catalog():
+    catalog = _catalog()
+    return dedupe_on_key(catalog, title_keys(catalog["title"]), CATALOG_DEDUPE_POLICY)
+
+
+def _deduped_catalog():
+    # (catalog with one row per title key, report)
+    return cached_stage("deduped catalog", [files["netflix1.csv"]], _dedupe_catalog)
+
+
+def _open_stock_store():
+    # Rebuild the store when netflix.csv changed since it was built. The parsed prices are
+    # only held while building, every process then reads the one mapped copy
+    fingerprint = list(file_key(files["netflix.csv"]))
+    store = stock_store.open_store()
+    if store is not None and store["fingerprint"] == fingerprint:
+        return store
+
+    stock = _read_stock()[0]
+    stock_store.build_store(stock, fingerprint)
+    store = stock_store.open_store()
+    if store is None or store["fingerprint"] != fingerprint:
+        # The store on disk can't be used (another process may have built a newer version
+        # in between), this process keeps its own copy in memory
+        store = stock_store.memory_store(stock, fingerprint)
+    return store
+
+
+def _stock_store():
+    return cached_stage("stock store", [files["netflix.csv"]], _open_stock_store)
+
+
+def _build_stock_features():
+    # Only the new trading days are computed when days were appended to the history and the
+    # earlier prices are unchanged
+    prices = stock_store.price_history(_stock_store(), columns=["High", "Low", "Close"])
+    previous = _cache.get("stock features")
+    if previous is None:
+        features = stock_analytics.compute_features(prices)
+    else:
+        features = stock_analytics.update_features(*previous[1], prices)
+    return features, stock_analytics.price_digest(prices)
+
+
+def _stock_features():
+    return cached_stage("stock features", [files["netflix.csv"]], _build_stock_features)[0]
+
+
+def _title_index():
+    return cached_stage("title index", [files["netflix1.csv"]],
+                        lambda: build_title_index(_deduped_catalog()[0]["title"]))
+
+
+def _trigram_index():
+    return cached_stage("trigram index", [files["netflix1.csv"]],
+                        lambda: build_trigram_index(_deduped_catalog()[0]["title"]))
+
+
+def _merged():
+    return cached_stage("merged", list(files.values()),
+                        lambda: _merge(_originals(), _deduped_catalog()[0], _stock_store(),
+                                       _stock_features(), _title_index(), _trigram_index()))
+
+
+def _cleaned():
+    return cached_stage("cleaned", list(files.values()), lambda: _clean(_merged()))
+
+
+def _compacted():
+    # (netflix_df with compact dtypes, memory report)
+    return cached_stage("compacted", list(files.values()), lambda: compact_dtypes(_cleaned()))
+
+
+def _rollup_sources():
+    # Close over the whole stock history (views of the stock store), the IMDB Score of the
+    # premieres
+    stock = stock_store.price_history(_stock_store(), columns=["Close"])
+    return {"Close": stock, "IMDB Score": _compacted()[0][["Date", "IMDB Score"]]}
+
+
+def _build_rollups():
+    # Start from the cube of the previous version of the data, so new days and premieres
+    # only roll up the periods they fall in
+    previous = _cache.get("rollups")
+    if previous is None:
+        return rollups.build_cube(_rollup_sources())
+    return rollups.update_cube(previous[1], _rollup_sources())
+
+
+def _rollups():
+    return cached_stage("rollups", list(files.values()), _build_rollups)
+
+
+def _build_event_study():
+    # Events are the trading days the premieres were joined to
+    netflix_df = _compacted()[0]
+    positions = stock_store.lookup(_stock_store(), netflix_df["Date"].values,
+                                   STOCK_JOIN_DIRECTION, STOCK_JOIN_TOLERANCE)
+    return event_study.event_study(_stock_features()["Return"].values, positions,
+                                   labels=netflix_df["title"].values)
+
+
+def _event_study():
+    return cached_stage("event study", list(files.values()), _build_event_study)
+
+
+def _correlations():
+    return cached_stage("correlations", list(files.values()),
+                        lambda: correlation.premiere_correlations(_compacted()[0]))
+
+
+def _table_orders():
+    return cached_stage("table orders", list(files.values()),
+                        lambda: table_pages.build_orders(_compacted()[0]))
+
+
+def _build_top_k():
+    # Premieres appended to the Originals are merged into the top lists of the previous index,
+    # any other change of the rows builds the index again (see top_k.update_top_k)
+    previous = _cache.get("top k")
+    if previous is None:
+        return top_k.build_top_k(_compacted()[0])
+    return top_k.update_top_k(previous[1], _compacted()[0])
+
+
+def _top_k():
+    return cached_stage("top k", list(files.values()), _build_top_k)
+
+
+# The public loaders return a copy, so a session can add columns or sort in place
+# without changing the frame the other sessions see.
+
+def _read_projected(name, columns):
+    # The snapshot only has the columns of the app, other columns are parsed from the CSV
+    # so they don't replace the snapshot of the pipeline. A stale snapshot is rebuilt with
+    # all the columns of the app, and the requested ones are taken from it
+    if set(columns) <= set(needed_columns(name)):
+        return _snapshot(name)[0][renamed(name, columns)]
+    return encode_categories(_parse(name, columns)[0])
+
+
+def _projected(name, columns):
+    # Stage with other columns than the app needs, cached apart from the pipeline stages
+    return cached_stage("%s %s" % (name, ",".join(columns)), [files[name]],
+                        lambda: _read_projected(name, list(columns)))
+
+
+def load_originals(columns=None):
+    """Netflix Originals with IMDB scores, with Premiere parsed as Date.
+
+    By default only the columns the app uses are read, pass the CSV column
+    names you need as ``columns`` to read others.
+    """
+    if columns is not None:
+        return _projected("NetflixOriginals.csv", columns).copy()
+    return _originals().copy()
+
+
+def load_catalog(columns=None):
+    """General Netflix series / movies catalog.
+
+    By default only the columns the app uses are read, pass the CSV column
+    names you need as ``columns`` to read others.
+    """
+    if columns is not None:
+        return _projected("netflix1.csv", columns).copy()
+    return _catalog().copy()
+
+
+def load_stock(columns=None, start=None, end=None):
+    """Netflix daily stock prices, with Date parsed.
+
+    Read from the stock store (prices as float32, Volume as int64), so pass
+    ``start`` and ``end`` dates (inclusive) to only read the days you need.
+    """
+    store = _stock_store()
+    names = [column for column in columns if column != "Date"] if columns is not None else None
+    stock = stock_store.to_frame(store, stock_store.range_slice(store, start, end), names)
+    if columns is not None:
+        return stock[list(columns)]
+    return stock
+
+
+def load_stock_store():
+    """The memory-mapped stock store, see stock_store.py for the queries it answers."""
+    return _stock_store()
+
+
+def load_stock_features():
+    """Rolling analytics of the whole stock history, see stock_analytics.py."""
+    return _stock_features().copy()
+
+
+def load_event_study():
+    """Returns, abnormal returns and CAR around every premiere, see event_study.py."""
+    return {name: value.copy() for name, value in _event_study().items()}
+
+
+def load_correlations():
+    """Correlations of the movie and stock features with p-values and confidence intervals."""
+    return _correlations().copy()
+
+
+def load_rollups():
+    """The rollup cube of Close and IMDB Score, see rollups.py for the lookups."""
+    return _rollups()
+
+
+def load_merged():
+    """The Originals left joined with the catalog rating and the stock prices."""
+    return _merged().copy()
+
+
+def load_netflix_df():
+    """The merged Dataframe sorted by Date, with the NaN values handled.
+
+    Low cardinality text columns are categoricals, prices are float32 and
+    whole-number columns are the smallest integer type that fits.
+    """
+    return _compacted()[0].copy()
+
+
+def load_table_columns():
+    """The columns of the table of load_table_page, without copying the frame."""
+    return list(_compacted()[0].columns)
+
+
+def load_table_page(sort_by=None, ascending=True, filter_column=None, filter_text="", page=0,
+                    page_size=table_pages.PAGE_SIZE):
+    """One page of load_netflix_df(), sorted and filtered on the server (see table_pages.py).
+
+    Returns the rows of the page and the number of rows over all pages.
+    """
+    return table_pages.table_page(_compacted()[0], _table_orders(), sort_by, ascending,
+                                  filter_column, filter_text, page, page_size)
+
+
+def load_top_k(n=20, group=None, key=None):
+    """The n movies with the highest IMDB Score, overall or of one Genre, rating or year.
+
+    ``group`` is "Genre", "rating" or "year" and ``key`` its value, for
+    example ``load_top_k(10, "Genre", "Drama")``. See top_k.py.
+    """
+    return top_k.top_rows(_top_k(), _compacted()[0], n, group, key).copy()
+
+
+def load_memory_report():
+    """Memory in bytes of the merged Dataframe before and after compacting its dtypes."""
+    return dict(_compacted()[1])
+
+
+def load_dedupe_report():
+    """How many titles of the catalog had duplicates, and how many rows were dropped."""
+    return dict(_deduped_catalog()[1])
+
+
+def load_rejects():
+    """The rows of every dataset whose dates didn't match the formats of the schema.
+
+    These are the rows the pipeline dropped when it parsed the datasets,
+    including the rejected rows of the stock days appended since.
+    """
+    return {name: _rejects(name).copy() for name in DATASETS}
+
+
+def ingest():
+    """Convert every CSV file in data/ to its typed snapshot."""
+    for name, read in _READERS.items():
+        df, rejects = read()
+        print(name, len(df), "rows,", len(rejects), "rejected")
+
+
+if __name__ == "__main__":
+    ingest()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Multi-level time rollups of the stock and IMDB metrics.
+
+The cube holds, for every metric and every level (day, week, month,
+quarter, year), a table with the median, mean, min, max and count per
+period, indexed by the integer period code of time_buckets.py. Every table
+is computed with one grouped ``agg`` over the rows of the metric. When rows
+are appended to a source, only the periods from the first new row on are
+computed again.
+"""
+
+import numpy as np
+import pandas as pd
+
+from row_hashes import only_appended, row_hashes, rows_digest
+from time_buckets import LEVELS, MISSING, bucket_codes, bucket_start
+
+
+STATS = ["median", "mean", "min", "max", "count"]
+
+
+def aggregate(frame, metric, level):
+    """Compute all stats of a metric per period of a level in one grouped pass.
+
+    ``frame`` has a Date column and the metric column, as a Dataframe or a
+    dict of arrays.
+    """
+    codes = bucket_codes(np.asarray(frame["Date"]), level)
+    valid = codes != MISSING
+    values = pd.Series(np.asarray(frame[metric])[valid])
+    return values.groupby(pd.Index(codes[valid], name=level)).agg(STATS)
+
+
+def _hashes(frame, metric):
+    return row_hashes(frame, ["Date", metric])
+
+
+def _add_metric(cube, metric, frame, hashes=None):
+    for level in LEVELS:
+        cube["tables"][(metric, level)] = aggregate(frame, metric, level)
+    if hashes is None:
+        hashes = _hashes(frame, metric)
+    cube["rows"][metric] = len(frame["Date"])
+    cube["digest"][metric] = rows_digest(hashes)
+
+
+def build_cube(sources):
+    """Build the rollup cube.
+
+    ``sources`` maps every metric to a Dataframe (or a dict of arrays, like
+    ``stock_store.price_history``) with a Date column and the metric column,
+    sorted by Date.
+    """
+    cube = {"tables": {}, "rows": {}, "digest": {}}
+    for metric, frame in sources.items():
+        _add_metric(cube, metric, frame)
+    return cube
+
+
+def update_cube(cube, sources):
+    """Return the cube brought up to date with the sources.
+
+    A source that only got rows appended after the rows the cube has seen
+    (the Date and metric of the old rows hash the same, see row_hashes.py)
+    only has the periods from its first new row on computed again, every
+    other source is rolled up again completely. The cube passed in isn't
+    changed.
+    """
+    cube = {key: dict(value) for key, value in cube.items()}
+    for metric, frame in sources.items():
+        seen = cube["rows"].get(metric)
+        hashes = _hashes(frame, metric)
+        if seen is None or not only_appended(hashes, seen, cube["digest"][metric]):
+            _add_metric(cube, metric, frame, hashes)
+            continue
+        dates = np.asarray(frame["Date"])
+        if seen == len(dates):
+            continue
+
+        first_new = dates[seen]
+        for level in LEVELS:
+            # The rows of the periods with new rows are at the end, because the frame is sorted
+            start = bucket_start(bucket_codes([first_new], level), level)[0]
+            first = np.searchsorted(dates, start)
+            tail = {"Date": dates[first:], metric: np.asarray(frame[metric])[first:]}
+            fresh = aggregate(tail, metric, level)
+            table = cube["tables"][(metric, level)]
+            table = table[table.index < fresh.index[0]]
+            cube["tables"][(metric, level)] = pd.concat([table, fresh])
+        cube["rows"][metric] = len(dates)
+        cube["digest"][metric] = rows_digest(hashes)
+    return cube
+
+
+def rollup(cube, metric, level, stat="median"):
+    """Look up one stat of a metric per period code of a level, as a Series."""
+    return cube["tables"][(metric, level)][stat]
+
+
+def rollup_table(cube, level, stat="median", metrics=None):
+    """Look up one stat per period code of a level for several metrics, one column per metric.
+
+    Use ``time_buckets.bucket_start`` on the index to plot the periods.
+    """
+    if metrics is None:
+        metrics = [metric for metric, table_level in cube["tables"] if table_level == level]
+    return pd.concat([rollup(cube, metric, level, stat).rename(metric) for metric in metrics],
+                     axis=1)
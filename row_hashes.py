@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Row hashes to tell appended rows from changed rows.
+
+An incremental stage keeps the digest of the rows it was computed from.
+When the frame comes back longer, the digest of its first rows shows
+whether those rows are unchanged: only then may the old result be extended
+with the new rows. An edit or an insert anywhere in the old rows changes
+the digest, and the stage is computed again.
+"""
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+
+# Multiplier that mixes the hashes of the columns of a dict into one hash per row
+_MIX = np.uint64(1000003)
+
+
+def row_hashes(df, columns=None):
+    """The uint64 hash of the values of every row (the index isn't hashed).
+
+    ``df`` is a Dataframe, or a dict of equally long arrays like the views of
+    stock_store.py. The columns of a dict are hashed one at a time, without
+    building a frame of them.
+    """
+    if isinstance(df, dict):
+        columns = list(df) if columns is None else list(columns)
+        hashes = np.zeros(len(df[columns[0]]), dtype=np.uint64)
+        for column in columns:
+            hashes = hashes * _MIX ^ pd.util.hash_array(np.asarray(df[column]))
+        return hashes
+    if columns is not None:
+        df = df[list(columns)]
+    return pd.util.hash_pandas_object(df, index=False).values
+
+
+def rows_digest(hashes):
+    """The digest of a run of row hashes, equal digests mean equal rows."""
+    return hashlib.blake2b(np.ascontiguousarray(hashes).tobytes(), digest_size=16).hexdigest()
+
+
+def only_appended(hashes, seen, digest):
+    """Whether the first ``seen`` rows are the rows of ``digest``, the rest being appended."""
+    return 0 < seen <= len(hashes) and rows_digest(hashes[:seen]) == digest
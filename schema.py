@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Schema registry of the datasets in data/.
+
+Every dataset declares the exact format(s) of its date columns and the
+columns to rename after loading. Dates are parsed with ``pd.to_datetime``
+and an explicit format, which is vectorized, instead of letting Pandas
+guess the format row by row. Rows whose date doesn't match any of the
+formats are moved to a rejects frame instead of silently becoming NaT.
+"""
+
+import pandas as pd
+
+
+# Dataset file name -> schema
+#   dates:   column -> list of strptime formats, tried in order
+#   renames: column renames applied after parsing
+DATASETS = {
+    "NetflixOriginals.csv": {
+        # "August 5, 2019", and a few rows are written as "October 16. 2019"
+        "dates": {"Premiere": ["%B %d, %Y", "%B %d. %Y"]},
+        "renames": {"Premiere": "Date", "Title": "title"},
+    },
+    "netflix1.csv": {
+        # "9/25/2021"
+        "dates": {"date_added": ["%m/%d/%Y"]},
+        "renames": {},
+    },
+    "netflix.csv": {
+        # "2002-05-23"
+        "dates": {"Date": ["%Y-%m-%d"]},
+        "renames": {},
+    },
+}
+
+# Extra columns of a rejects frame, next to the raw values of the rejected row
+REJECT_COLUMNS = ["rejected column", "line"]
+
+
+def parse_date_column(values, formats):
+    """Parse a column of date strings with explicit formats.
+
+    Every format is tried once on all values that are still unparsed. Returns
+    the parsed datetime64 Series, and a boolean mask of the values that were
+    present but didn't match any of the formats.
+    """
+    parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    todo = values.notna()
+    for fmt in formats:
+        if not todo.any():
+            break
+        attempt = pd.to_datetime(values[todo], format=fmt, errors="coerce")
+        parsed[todo] = attempt
+        todo &= parsed.isna()
+    return parsed, todo
+
+
+def parse_dates(df, name):
+    """Parse the date columns of a dataset, and rename its columns.
+
+    Returns the parsed Dataframe without the rejected rows, and a rejects
+    frame with the raw values of those rows, the column that failed and the
+    line number in the CSV file.
+    """
+    schema = DATASETS[name]
+    df = df.copy()
+    rejects = []
+    rejected = pd.Series(False, index=df.index)
+
+    for column, formats in schema["dates"].items():
+        if column not in df.columns:
+            continue
+        parsed, failed = parse_date_column(df[column], formats)
+        if failed.any():
+            reject = df[failed].copy()
+            reject["rejected column"] = column
+            rejects.append(reject)
+        df[column] = parsed
+        rejected |= failed
+
+    if rejects:
+        rejects = pd.concat(rejects)
+    else:
+        rejects = df.iloc[:0].copy()
+        for column in REJECT_COLUMNS:
+            rejects[column] = pd.Series(dtype=object)
+    # Line number in the CSV file, counting the header as line 1
+    rejects["line"] = rejects.index + 2
+
+    df = df[~rejected].rename(columns=schema["renames"])
+    return df, rejects
+
+
+def read_dataset(name, path, **read_csv_kwargs):
+    """Read a dataset CSV file and parse it with its schema.
+
+    Extra keyword arguments are passed to ``pd.read_csv``, pass ``usecols`` to
+    only parse the columns you need. Returns the parsed Dataframe and its
+    rejects frame.
+    """
+    schema = DATASETS[name]
+    # Read the date columns as text, they're parsed with their explicit format
+    usecols = read_csv_kwargs.get("usecols")
+    dtype = {column: str for column in schema["dates"] if usecols is None or column in usecols}
+    df = pd.read_csv(path, dtype=dtype, **read_csv_kwargs)
+    return parse_dates(df, name)
+
+
+def renamed(name, columns):
+    """Return the names of CSV columns of a dataset after its renames."""
+    renames = DATASETS[name]["renames"]
+    return [renames.get(column, column) for column in columns]
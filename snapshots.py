@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Typed columnar snapshots of the CSV datasets.
+
+A snapshot is an uncompressed Feather (Arrow IPC) file in data/snapshots/,
+written once from the parsed CSV: dates are stored as datetime64 and low
+cardinality text columns as categoricals. The size and mtime of the source
+CSV are stored in the schema metadata, so a snapshot is rebuilt as soon as
+its CSV changes. Reading a snapshot memory-maps the file instead of parsing
+text. The rows whose dates didn't parse are stored in a rejects snapshot
+next to it.
+
+Without pyarrow installed the loaders simply parse the CSV every time.
+"""
+
+import os
+
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+    feather = None
+
+from compact import CATEGORY_MAX_RATIO, encode_category
+
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "snapshots")
+
+# Bump this when the layout of the snapshots changes, so old ones are rebuilt
+SNAPSHOT_VERSION = "2"
+
+
+def snapshot_path(name):
+    return os.path.join(SNAPSHOT_DIR, name + ".feather")
+
+
+def rejects_name(name):
+    """Name of the snapshot with the rejected rows of a snapshot."""
+    return name + ".rejects"
+
+
+def source_metadata(source_path):
+    """Return the snapshot metadata that identifies the current version of a CSV file."""
+    stat = os.stat(source_path)
+    return {b"snapshot_version": SNAPSHOT_VERSION.encode(),
+            b"source_size": str(stat.st_size).encode(),
+            b"source_mtime_ns": str(stat.st_mtime_ns).encode()}
+
+
+def encode_categories(df, max_ratio=CATEGORY_MAX_RATIO):
+    """Convert the low cardinality text columns of a Dataframe to categoricals.
+
+    Uses the same threshold as compact_dtypes, see compact.py.
+    """
+    df = df.copy()
+    for column in df.columns:
+        df[column] = encode_category(df[column], max_ratio)
+    return df
+
+
+def write_snapshot(name, df, source_path, fingerprint=None):
+    """Write a Dataframe as the snapshot of a source CSV file.
+
+    Pass the ``fingerprint`` taken before the CSV was parsed, so a CSV
+    that changes during the parse never gets a snapshot marked as fresh.
+    """
+    if fingerprint is None:
+        fingerprint = source_metadata(source_path)
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata.update(fingerprint)
+    table = table.replace_schema_metadata(metadata)
+
+    # Write to a temporary file first, so a reader never maps half a snapshot
+    path = snapshot_path(name)
+    tmp_path = "%s.%d.tmp" % (path, os.getpid())
+    feather.write_feather(table, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(name, source_path, columns=None):
+    """Return the snapshot of a source CSV file, or None when it is missing or stale."""
+    if feather is None:
+        return None
+    path = snapshot_path(name)
+    try:
+        table = feather.read_table(path, columns=columns, memory_map=True)
+    except (OSError, KeyError, ValueError):
+        # Missing, or it doesn't have all the requested columns
+        return None
+
+    metadata = table.schema.metadata or {}
+    expected = source_metadata(source_path)
+    if any(metadata.get(key) != value for key, value in expected.items()):
+        return None
+    return table.to_pandas()
+
+
+def load_snapshot(name, source_path, parse, columns=None):
+    """Read the snapshot of a CSV file, or parse the CSV and store a new snapshot.
+
+    ``parse`` is a function without arguments that reads the CSV into a typed
+    Dataframe and the rejects frame of the rows it couldn't parse. The rejects
+    get a snapshot of their own. Pass ``columns`` to only read those columns
+    of the snapshot; a snapshot without one of them is parsed again. Returns
+    the Dataframe and its rejects.
+    """
+    df = read_snapshot(name, source_path, columns)
+    rejects = read_snapshot(rejects_name(name), source_path)
+    if df is not None and rejects is not None:
+        return df, rejects
+
+    fingerprint = source_metadata(source_path)
+    df, rejects = parse()
+    df = encode_categories(df)
+    rejects = rejects.reset_index(drop=True)
+    if feather is not None:
+        try:
+            write_snapshot(name, df, source_path, fingerprint)
+            write_snapshot(rejects_name(name), rejects, source_path, fingerprint)
+        except OSError:
+            # A read-only data folder only means we parse again next time
+            pass
+    if columns is not None:
+        df = df[columns]
+    return df, rejects
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Rolling analytics of the daily stock prices.
+
+Computes, for the whole stock history at once, the daily return and log
+return, the drawdown from the running peak, and per window the rolling mean
+of Close, the rolling volatility (standard deviation of the log returns)
+and the average true range (ATR). The feature rows line up with the rows of
+the stock history, so a premiere that is joined to a trading day gets the
+features of that day.
+"""
+
+import numpy as np
+import pandas as pd
+
+from row_hashes import only_appended, row_hashes, rows_digest
+
+
+# Rolling windows in trading days: a week, a month and a quarter
+WINDOWS = (5, 20, 60)
+
+# Columns of the price history the features are computed from
+PRICE_COLUMNS = ["Date", "High", "Low", "Close"]
+
+
+def _window_columns(window):
+    return ["Mean Close %dd" % window, "Volatility %dd" % window, "ATR %dd" % window]
+
+
+def feature_columns(windows=WINDOWS):
+    """Names of the feature columns, in order."""
+    columns = ["Return", "Log Return", "Peak", "Drawdown"]
+    for window in windows:
+        columns += _window_columns(window)
+    return columns
+
+
+def compute_features(prices, windows=WINDOWS, peak=None):
+    """Compute the features of a price history in one vectorized pass per window.
+
+    ``prices`` has Date, High, Low and Close columns sorted by Date: a
+    Dataframe, or a dict of arrays like ``stock_store.price_history``. ``peak``
+    is the running peak of Close before the first row, when ``prices``
+    continues an earlier history. Returns a Dataframe with the Date and the
+    feature columns, one row per row of ``prices``.
+    """
+    close = pd.Series(np.asarray(prices["Close"], dtype=np.float64))
+    high = pd.Series(np.asarray(prices["High"], dtype=np.float64))
+    low = pd.Series(np.asarray(prices["Low"], dtype=np.float64))
+    previous_close = close.shift(1)
+
+    features = pd.DataFrame({"Date": np.asarray(prices["Date"])})
+    features["Return"] = close / previous_close - 1
+    features["Log Return"] = np.log(close / previous_close)
+
+    running_peak = close.cummax()
+    if peak is not None:
+        running_peak = np.maximum(running_peak, peak)
+    features["Peak"] = running_peak
+    features["Drawdown"] = close / running_peak - 1
+
+    # True range: the high - low range, stretched to the previous close after a gap
+    true_range = pd.concat([high - low, (high - previous_close).abs(),
+                            (low - previous_close).abs()], axis=1).max(axis=1)
+    for window in windows:
+        mean, volatility, atr = _window_columns(window)
+        features[mean] = close.rolling(window).mean()
+        features[volatility] = features["Log Return"].rolling(window).std()
+        features[atr] = true_range.rolling(window).mean()
+    return features
+
+
+def price_digest(prices):
+    """Digest of the price columns, to pass to ``update_features`` later."""
+    return rows_digest(row_hashes(prices, PRICE_COLUMNS))
+
+
+def update_features(features, digest, prices, windows=WINDOWS):
+    """Return the features of a price history that got rows appended.
+
+    ``digest`` is the ``price_digest`` of the prices ``features`` was
+    computed from. Only the new rows are computed, with the last
+    ``max(windows)`` rows before them as context for the rolling windows.
+    When the first rows of ``prices`` don't hash to ``digest`` anymore (a
+    price was rewritten or a day inserted), everything is computed again.
+    """
+    seen = len(features)
+    if not only_appended(row_hashes(prices, PRICE_COLUMNS), seen, digest):
+        return compute_features(prices, windows)
+    if seen == len(prices["Date"]):
+        return features
+
+    # One extra row of context for the return of the first new row
+    context = max(windows) + 1
+    start = max(seen - context, 0)
+    peak = features["Peak"].iloc[start - 1] if start > 0 else None
+    tail = {column: np.asarray(prices[column])[start:] for column in PRICE_COLUMNS}
+    fresh = compute_features(tail, windows, peak=peak)
+    return pd.concat([features, fresh.iloc[seen - start:]], ignore_index=True)
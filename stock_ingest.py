@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Incremental ingest of the daily stock prices in netflix.csv.
+
+netflix.csv only grows at the end, one row per trading day. After a full
+parse we store a checkpoint next to the snapshot with the byte offset up to
+which the file was ingested, the last Date and a hash of the ingested bytes.
+On the next refresh only the bytes after the offset are parsed and appended
+to the stored stock table. When the ingested part of the file doesn't hash
+the same anymore (earlier rows were rewritten), or the new rows don't come
+after the last Date, the table is rebuilt from scratch. The rows whose Date
+doesn't parse are stored as rejects, the rejects of appended rows are added
+to them.
+"""
+
+import hashlib
+import io
+import json
+import os
+
+import pandas as pd
+
+import snapshots
+from schema import parse_dates, read_dataset
+
+
+NAME = "netflix.csv"
+SNAPSHOT_NAME = "netflix"
+
+
+def checkpoint_path():
+    return os.path.join(snapshots.SNAPSHOT_DIR, SNAPSHOT_NAME + ".checkpoint.json")
+
+
+def _read_checkpoint():
+    try:
+        with open(checkpoint_path(), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_checkpoint(checkpoint):
+    path = checkpoint_path()
+    tmp_path = "%s.%d.tmp" % (path, os.getpid())
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def _hash_prefix(path, offset):
+    """Return the blake2b hash object of the first ``offset`` bytes of a file."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        remaining = offset
+        while remaining > 0:
+            chunk = f.read(min(remaining, 1 << 20))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest
+
+
+def _read_stored(name):
+    # The last stored snapshot, even when the file got rows appended since
+    try:
+        return pd.read_feather(snapshots.snapshot_path(name))
+    except (OSError, ValueError):
+        return None
+
+
+def _store(df, rejects, path, fingerprint, offset, digest, header_size):
+    snapshots.write_snapshot(SNAPSHOT_NAME, df, path, fingerprint)
+    snapshots.write_snapshot(snapshots.rejects_name(SNAPSHOT_NAME), rejects, path, fingerprint)
+    _write_checkpoint({"offset": offset,
+                       "header_size": header_size,
+                       "prefix_hash": digest.hexdigest(),
+                       "last_date": str(df["Date"].max()),
+                       "rows": len(df),
+                       "rejects": len(rejects)})
+
+
+def rebuild(path, encoding=None):
+    """Parse the whole stock file, and store the table with a new checkpoint.
+
+    Returns the stock table and its rejects.
+    """
+    fingerprint = snapshots.source_metadata(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    df, rejects = read_dataset(NAME, io.BytesIO(data), encoding=encoding)
+    df = df.reset_index(drop=True)
+    rejects = rejects.reset_index(drop=True)
+    header_size = data.index(b"\n") + 1 if b"\n" in data else len(data)
+
+    digest = hashlib.blake2b(data, digest_size=16)
+    if snapshots.feather is not None:
+        _store(df, rejects, path, fingerprint, len(data), digest, header_size)
+    return df, rejects
+
+
+def ingest(path, encoding=None):
+    """Return the stock table and its rejects, parsing only the rows appended since the last ingest.
+
+    Falls back to ``rebuild`` when there is no checkpoint yet, or when the
+    already ingested part of the file changed.
+    """
+    df = snapshots.read_snapshot(SNAPSHOT_NAME, path)
+    rejects = snapshots.read_snapshot(snapshots.rejects_name(SNAPSHOT_NAME), path)
+    if df is not None and rejects is not None:
+        return df, rejects
+
+    checkpoint = _read_checkpoint()
+    if snapshots.feather is None or checkpoint is None:
+        return rebuild(path, encoding)
+
+    offset = checkpoint["offset"]
+    fingerprint = snapshots.source_metadata(path)
+    if os.path.getsize(path) < offset:
+        return rebuild(path, encoding)
+
+    # The ingested part must be byte for byte the same as last time
+    digest = _hash_prefix(path, offset)
+    if digest.hexdigest() != checkpoint["prefix_hash"]:
+        return rebuild(path, encoding)
+
+    stored = _read_stored(SNAPSHOT_NAME)
+    stored_rejects = _read_stored(snapshots.rejects_name(SNAPSHOT_NAME))
+    if stored is None or stored_rejects is None or len(stored) != checkpoint["rows"] \
+            or len(stored_rejects) != checkpoint.get("rejects"):
+        return rebuild(path, encoding)
+
+    with open(path, "rb") as f:
+        header = f.read(checkpoint["header_size"])
+        f.seek(offset)
+        tail = f.read()
+
+    # Only take complete lines, a row that is still being written is picked up next time
+    tail = tail[:tail.rfind(b"\n") + 1]
+    if tail.strip():
+        new, rejects = parse_dates(pd.read_csv(io.BytesIO(header + tail), dtype={"Date": str},
+                                               encoding=encoding), NAME)
+        if len(new) and new["Date"].min() <= pd.Timestamp(checkpoint["last_date"]):
+            # Rows were inserted before the end, instead of appended
+            return rebuild(path, encoding)
+        # The line numbers of the new rejects count the rows before the tail
+        rejects["line"] += len(stored) + len(stored_rejects)
+        df = pd.concat([stored, new], ignore_index=True)
+        rejects = pd.concat([stored_rejects, rejects], ignore_index=True)
+    else:
+        df, rejects = stored, stored_rejects
+
+    digest.update(tail)
+    _store(df, rejects, path, fingerprint, offset + len(tail), digest, checkpoint["header_size"])
+    return df, rejects
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Memory-mapped store of the daily stock prices.
+
+The store is a folder of ``.npy`` files, one contiguous array per column:
+an int32 day number (days since 1970-01-01, sorted ascending) and the OHLCV
+columns. The arrays are opened with ``mmap_mode="r"``, so every Streamlit
+process maps the same pages of the OS page cache instead of holding its own
+copy. Date lookups are binary searches in the day numbers, and range queries
+return views of the mapped arrays without copying.
+
+Every build goes into its own folder, and ``current.json`` points to the
+newest one. Replacing that file is atomic, so a reader never opens a half
+written build. Builds take a lock file, so two processes that see the same
+change don't both write the store, and only the builds older than the
+previous current one are removed: a process that just read the previous
+``current.json`` can still open that build.
+"""
+
+import json
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from joins import asof_positions
+
+
+STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "stock_store")
+
+# Column -> dtype of the arrays in the store. The prices are exact in float32 (see compact.py)
+COLUMNS = {"High": np.float32,
+           "Low": np.float32,
+           "Open": np.float32,
+           "Close": np.float32,
+           "Volume": np.int64,
+           "Adj Close": np.float32}
+
+
+def day_numbers(dates):
+    """Convert dates to int32 day numbers (days since 1970-01-01)."""
+    return np.asarray(dates, dtype="datetime64[ns]").astype("datetime64[D]").astype(np.int32)
+
+
+def _dates(days):
+    # datetime64[ns] dates of day numbers
+    return days.astype("datetime64[D]").astype("datetime64[ns]")
+
+
+def _file_name(column):
+    return column.lower().replace(" ", "_") + ".npy"
+
+
+def _read_current(store_dir):
+    try:
+        with open(os.path.join(store_dir, "current.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _build_time(name):
+    # The time a build started, from its folder name (0 for folders without one)
+    prefix = name.split("-")[0]
+    return int(prefix) if prefix.isdigit() else 0
+
+
+def _lock(store_dir):
+    # An exclusive lock on a file in the store, released when the file is closed. Without
+    # fcntl (Windows) builds aren't locked, the build names still keep them apart
+    lock = open(os.path.join(store_dir, ".lock"), "a")
+    if fcntl is not None:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+    return lock
+
+
+def build_store(stock_df, fingerprint, store_dir=STORE_DIR):
+    """Write the stock prices to a new build of the store and make it current.
+
+    ``fingerprint`` identifies the source data (any JSON value); ``open_store``
+    returns it so the caller can tell whether the store is stale. When
+    another process built the store of the same ``fingerprint`` while this
+    one waited for the lock, nothing is written.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    with _lock(store_dir):
+        previous = _read_current(store_dir)
+        if previous is not None and previous.get("fingerprint") == fingerprint:
+            return
+
+        # Build names start with the time, to tell the older builds from the newer ones
+        stock_df = stock_df.sort_values("Date", kind="mergesort")
+        build = "%020d-%s" % (time.time_ns(), uuid.uuid4().hex)
+        build_dir = os.path.join(store_dir, build)
+        os.makedirs(build_dir)
+
+        np.save(os.path.join(build_dir, "day.npy"), day_numbers(stock_df["Date"].values))
+        for column, dtype in COLUMNS.items():
+            np.save(os.path.join(build_dir, _file_name(column)),
+                    stock_df[column].values.astype(dtype))
+
+        current = os.path.join(store_dir, "current.json")
+        tmp_path = "%s.%s.tmp" % (current, build)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"build": build, "fingerprint": fingerprint, "rows": len(stock_df)}, f)
+        os.replace(tmp_path, current)
+
+        # Remove the builds older than the previous current one. Processes that still map
+        # them keep their pages until they close them, that is how unlinking an open file works
+        if previous is None:
+            return
+        for name in os.listdir(store_dir):
+            if _build_time(name) < _build_time(previous["build"]) \
+                    and os.path.isdir(os.path.join(store_dir, name)):
+                shutil.rmtree(os.path.join(store_dir, name), ignore_errors=True)
+
+
+def memory_store(stock_df, fingerprint):
+    """A store like ``open_store`` returns, held in memory instead of mapped from files.
+
+    For when the store on disk can't be opened.
+    """
+    stock_df = stock_df.sort_values("Date", kind="mergesort")
+    store = {"day": day_numbers(stock_df["Date"].values)}
+    for column, dtype in COLUMNS.items():
+        store[column] = stock_df[column].values.astype(dtype)
+    store["fingerprint"] = fingerprint
+    return store
+
+
+def open_store(store_dir=STORE_DIR):
+    """Memory-map the current build of the store.
+
+    Returns a dict with the "day" array, an array per column of ``COLUMNS``
+    and the "fingerprint" of the source data, or None when there is no store.
+    """
+    current = _read_current(store_dir)
+    if current is None:
+        return None
+    try:
+        build_dir = os.path.join(store_dir, current["build"])
+        store = {"day": np.load(os.path.join(build_dir, "day.npy"), mmap_mode="r")}
+        for column in COLUMNS:
+            store[column] = np.load(os.path.join(build_dir, _file_name(column)), mmap_mode="r")
+    except (OSError, ValueError, KeyError):
+        return None
+    store["fingerprint"] = current["fingerprint"]
+    return store
+
+
+def range_slice(store, start=None, end=None):
+    """Return the slice of the rows with a date between ``start`` and ``end`` (inclusive)."""
+    days = store["day"]
+    lo = 0 if start is None else np.searchsorted(days, day_numbers([start])[0], side="left")
+    hi = len(days) if end is None else np.searchsorted(days, day_numbers([end])[0], side="right")
+    return slice(int(lo), int(hi))
+
+
+def query_range(store, start=None, end=None, columns=None):
+    """Return views of the columns for the dates between ``start`` and ``end``.
+
+    The result is a dict of arrays like the store, that share the memory of
+    the mapped files.
+    """
+    rows = range_slice(store, start, end)
+    columns = list(COLUMNS) if columns is None else columns
+    result = {"day": store["day"][rows]}
+    for column in columns:
+        result[column] = store[column][rows]
+    return result
+
+
+def price_history(store, start=None, end=None, columns=None):
+    """Return ``query_range`` with a Date column instead of the day numbers.
+
+    Stock analytics and rollups take the result like a Dataframe. Only the
+    Date array is computed, the other columns stay views of the mapped files.
+    """
+    result = query_range(store, start, end, columns)
+    result["Date"] = _dates(result.pop("day"))
+    return result
+
+
+def lookup(store, dates, direction="backward", tolerance=None):
+    """Return the row position of the trading day of every date, -1 when there is none.
+
+    See ``joins.asof_positions`` for ``direction`` and ``tolerance`` (in days).
+    """
+    if tolerance is not None:
+        tolerance = pd.Timedelta(tolerance).days
+    dates = np.asarray(dates, dtype="datetime64[ns]")
+    positions = asof_positions(store["day"], day_numbers(dates), direction, tolerance)
+    return np.where(np.isnat(dates), -1, positions)
+
+
+def to_frame(store, rows=None, columns=None):
+    """Build a Dataframe with a Date column from rows of the store.
+
+    ``rows`` is a slice, or an array of row positions where -1 gives a row of
+    NaN (like a left join without a match). Without ``rows`` all rows are
+    returned.
+    """
+    columns = list(COLUMNS) if columns is None else columns
+    if rows is None:
+        rows = slice(None)
+    if isinstance(rows, slice):
+        data = {"Date": _dates(store["day"][rows])}
+        for column in columns:
+            data[column] = np.asarray(store[column][rows])
+        return pd.DataFrame(data)
+
+    rows = np.asarray(rows)
+    missing = rows < 0
+    take = np.where(missing, 0, rows)
+    dates = _dates(store["day"][take])
+    dates[missing] = np.datetime64("NaT")
+    data = {"Date": dates}
+    for column in columns:
+        values = store[column][take].astype(np.float64 if missing.any() else store[column].dtype)
+        if missing.any():
+            values[missing] = np.nan
+        data[column] = values
+    return pd.DataFrame(data)
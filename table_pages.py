@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Server-side pages of a sorted and filtered Dataframe.
+
+The browser only gets the rows of the page it shows. Every column is
+sorted once, when the frame is built, into a permutation of the row
+positions with the missing values last. A page of a sort is then a slice
+of its permutation, or of the permutation read backwards for a descending
+sort, which costs the size of the page and not the size of the frame. A
+filter is a boolean mask over the rows, the permutation is reduced to the
+rows of the mask with one vectorized lookup.
+"""
+
+import numpy as np
+from pandas.api.types import is_categorical_dtype
+
+
+PAGE_SIZE = 25
+
+
+def build_orders(df):
+    """Sort every column of a Dataframe once.
+
+    Returns a dict with per column the permutation of the row positions in
+    ascending order (stable, missing values last) and the number of
+    non-missing values.
+    """
+    orders = {}
+    for column in df.columns:
+        values = df[column].reset_index(drop=True)
+        order = values.sort_values(kind="mergesort", na_position="last").index.values
+        orders[column] = (order.astype(np.int64), int(values.notna().sum()))
+    return orders
+
+
+def filter_mask(df, column, text):
+    """Rows whose ``column`` contains ``text``, case-insensitive.
+
+    A categorical column is matched on its categories and then on the codes,
+    so the text of every category is only searched once.
+    """
+    values = df[column]
+    text = text.lower()
+    if is_categorical_dtype(values):
+        categories = values.cat.categories.astype(str).str.lower()
+        matching = np.append(categories.str.contains(text, regex=False), False)
+        return matching[values.cat.codes.values]
+    matching = values.astype(str).str.lower().str.contains(text, regex=False).values
+    return matching & values.notna().values
+
+
+def _sequence(order, valid, ascending, positions):
+    # The rows at ``positions`` of the ascending or descending sort, missing values stay last
+    if ascending:
+        return order[positions]
+    descending = order[np.clip(valid - 1 - positions, 0, None)]
+    return np.where(positions < valid, descending, order[positions])
+
+
+def page_positions(n_rows, order=None, ascending=True, mask=None, page=0, page_size=PAGE_SIZE):
+    """Row positions of a page, and the number of rows over all pages.
+
+    ``order`` is a (permutation, non-missing count) pair of ``build_orders``,
+    None keeps the rows in their order. ``mask`` selects the rows of a
+    filter. A page past the last one gives the last page.
+    """
+    if order is None:
+        order = (np.arange(n_rows), n_rows)
+    permutation, valid = order
+
+    if mask is None:
+        total = n_rows
+    else:
+        everything = _sequence(permutation, valid, ascending, np.arange(n_rows))
+        permutation = everything[mask[everything]]
+        total = valid = len(permutation)
+        ascending = True
+
+    pages = max(-(-total // page_size), 1)
+    page = min(max(page, 0), pages - 1)
+    positions = np.arange(page * page_size, min((page + 1) * page_size, total))
+    return _sequence(permutation, valid, ascending, positions), total
+
+
+def table_page(df, orders, sort_by=None, ascending=True, filter_column=None, filter_text="",
+               page=0, page_size=PAGE_SIZE):
+    """One page of ``df`` sorted on ``sort_by`` and filtered on ``filter_column``.
+
+    ``orders`` comes from ``build_orders(df)``. Returns the rows of the page
+    (a new Dataframe) and the number of rows over all pages.
+    """
+    mask = filter_mask(df, filter_column, filter_text) if filter_column and filter_text else None
+    order = orders[sort_by] if sort_by is not None else None
+    positions, total = page_positions(len(df), order, ascending, mask, page, page_size)
+    return df.iloc[positions], total
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Integer period codes for grouping dates.
+
+Grouping on integers is much faster than grouping on Period objects. The
+codes are computed from datetime64 arrays with numpy unit casts, for all
+dates at once, and only converted back to timestamps for plotting.
+
+    day      days since 1970-01-01
+    week     ISO weeks (Monday to Sunday) since the week of 1970-01-01
+    month    year * 12 + month - 1
+    quarter  year * 4 + quarter - 1
+    year     year
+
+Every code is increasing with the date, so sorting on the codes sorts the
+periods.
+"""
+
+import numpy as np
+
+
+LEVELS = ("day", "week", "month", "quarter", "year")
+
+# Code of a missing date (NaT)
+MISSING = np.iinfo(np.int64).min
+
+# 1970-01-01 was a Thursday, the Monday of its ISO week is 3 days earlier
+_WEEK_OFFSET = 3
+
+
+def bucket_codes(dates, level):
+    """Return the int64 period code of every date for a level."""
+    dates = np.asarray(dates, dtype="datetime64[ns]")
+    if level == "day":
+        codes = dates.astype("datetime64[D]").astype(np.int64)
+    elif level == "week":
+        codes = (dates.astype("datetime64[D]").astype(np.int64) + _WEEK_OFFSET) // 7
+    elif level == "month":
+        codes = dates.astype("datetime64[M]").astype(np.int64) + 1970 * 12
+    elif level == "quarter":
+        codes = (dates.astype("datetime64[M]").astype(np.int64) + 1970 * 12) // 3
+    elif level == "year":
+        codes = dates.astype("datetime64[Y]").astype(np.int64) + 1970
+    else:
+        raise ValueError("level must be one of %s, not %r" % (LEVELS, level))
+    return np.where(np.isnat(dates), MISSING, codes)
+
+
+def bucket_start(codes, level):
+    """Return the first day of the period of every code, as datetime64[ns]."""
+    codes = np.asarray(codes, dtype=np.int64)
+    if level == "day":
+        starts = codes.astype("datetime64[D]")
+    elif level == "week":
+        starts = (codes * 7 - _WEEK_OFFSET).astype("datetime64[D]")
+    elif level == "month":
+        starts = (codes - 1970 * 12).astype("datetime64[M]")
+    elif level == "quarter":
+        starts = (codes * 3 - 1970 * 12).astype("datetime64[M]")
+    elif level == "year":
+        starts = (codes - 1970).astype("datetime64[Y]")
+    else:
+        raise ValueError("level must be one of %s, not %r" % (LEVELS, level))
+    starts = starts.astype("datetime64[ns]")
+    return np.where(codes == MISSING, np.datetime64("NaT"), starts)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Top k rows by a value, overall and per group.
+
+The index keeps, for every group (Genre, rating or year of the premiere)
+and for all rows together, the positions of the k rows with the highest
+value, highest first. It is built with one sort over (group, value) for
+all groups at once. A top n list with n <= k is then a slice, without
+sorting the frame again. When rows are appended, and the hash of the old
+rows shows they are unchanged, only the top k of the groups the new rows
+fall in is merged with the new rows.
+
+Ties keep the order of the rows in the frame, missing values are never in
+a top list.
+"""
+
+import numpy as np
+import pandas as pd
+
+from row_hashes import only_appended, row_hashes, rows_digest
+from time_buckets import MISSING, bucket_codes
+
+
+# Rows kept per group, the longest top list the index can answer
+TOP_K = 100
+
+# Groups with their own top list, "year" is the year of the Date column
+GROUPS = ("Genre", "rating", "year")
+
+
+def _group_keys(df, group):
+    # The key of every row for a group, and which rows have one
+    if group is None:
+        return np.zeros(len(df), dtype=np.int64), np.ones(len(df), dtype=bool)
+    if group == "year":
+        keys = bucket_codes(df["Date"].values, "year")
+        return keys, keys != MISSING
+    keys = df[group].astype(object).values
+    return keys, pd.notna(keys)
+
+
+def _key(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _top_by_key(values, keys, positions, k):
+    # Per key the (values, positions) of the k highest values, from one sort over all keys
+    if not len(values):
+        return {}
+    codes = pd.factorize(keys)[0]
+    order = np.lexsort((positions, -values, codes))
+    codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    keep = order[rank < k]
+    bounds = np.flatnonzero(np.diff(codes[rank < k])) + 1
+    return {_key(keys[part[0]]): (values[part], positions[part]) for part in np.split(keep, bounds)}
+
+
+def _merge(old, new, k):
+    # Merge two (values, positions) top lists into the top k
+    values = np.concatenate([old[0], new[0]])
+    positions = np.concatenate([old[1], new[1]])
+    order = np.lexsort((positions, -values))[:k]
+    return values[order], positions[order]
+
+
+def _group_tops(df, value, group, start, k):
+    # The top lists of the rows from ``start`` on, per key of a group
+    values = df[value].values[start:].astype(np.float64)
+    keys, valid = _group_keys(df.iloc[start:], group)
+    valid &= ~np.isnan(values)
+    positions = np.arange(start, len(df))[valid]
+    return _top_by_key(values[valid], keys[valid], positions, k)
+
+
+def _hashed_columns(value, groups):
+    # The columns a top list depends on, "year" comes from Date
+    return ["Date", value] + [group for group in groups if group != "year"]
+
+
+def build_top_k(df, value="IMDB Score", groups=GROUPS, k=TOP_K, hashes=None):
+    """Build the top k index of ``df`` by ``value``, overall and per group."""
+    if hashes is None:
+        hashes = row_hashes(df, _hashed_columns(value, groups))
+    tops = {group: _group_tops(df, value, group, 0, k) for group in (None,) + tuple(groups)}
+    return {"value": value, "k": k, "rows": len(df), "digest": rows_digest(hashes), "tops": tops}
+
+
+def update_top_k(index, df):
+    """Return the index brought up to date with ``df``.
+
+    When ``df`` only got rows appended after the rows the index has seen
+    (the Date, value and group columns of the old rows hash the same), the
+    new rows are merged into the top lists of their groups. Otherwise the
+    index is built again. The index passed in isn't changed.
+    """
+    seen, k = index["rows"], index["k"]
+    groups = [group for group in index["tops"] if group is not None]
+    hashes = row_hashes(df, _hashed_columns(index["value"], groups))
+    if not only_appended(hashes, seen, index["digest"]):
+        return build_top_k(df, index["value"], groups, k, hashes)
+    if seen == len(df):
+        return index
+
+    tops = {}
+    for group, lists in index["tops"].items():
+        lists = dict(lists)
+        for key, new in _group_tops(df, index["value"], group, seen, k).items():
+            lists[key] = _merge(lists[key], new, k) if key in lists else new
+        tops[group] = lists
+    return {"value": index["value"], "k": k, "rows": len(df), "digest": rows_digest(hashes),
+            "tops": tops}
+
+
+def top_positions(index, n, group=None, key=None):
+    """Positions of the top n rows, overall or of one key of a group (e.g. "Genre", "Drama")."""
+    if n > index["k"]:
+        raise ValueError("the index keeps the top %d rows, not %d" % (index["k"], n))
+    lists = index["tops"][group]
+    if group is None:
+        key = 0
+    if key not in lists:
+        return np.array([], dtype=np.int64)
+    return lists[key][1][:n]
+
+
+def top_rows(index, df, n, group=None, key=None):
+    """The top n rows of ``df``, highest value first, see ``top_positions``."""
+    return df.iloc[top_positions(index, n, group, key)]